@@ -21,11 +21,36 @@ class ProductVariationsModule(AdminModule):
                 "shuup_product_variations.admin.views.products.ProductCombinationsView",
                 name="shuup_product_variations.product.combinations"
             ),
+            admin_url(
+                r"^shuup_product_variations/(?P<pk>\d+)/combinations/generate/$",
+                "shuup_product_variations.admin.views.products.ProductCombinationsGenerateView",
+                name="shuup_product_variations.product.combinations_generate"
+            ),
+            admin_url(
+                r"^shuup_product_variations/(?P<pk>\d+)/combinations/jobs/$",
+                "shuup_product_variations.admin.views.jobs.ProductCombinationsJobView",
+                name="shuup_product_variations.product.combinations_jobs"
+            ),
+            admin_url(
+                r"^shuup_product_variations/combinations_jobs/(?P<pk>\d+)/$",
+                "shuup_product_variations.admin.views.jobs.CombinationsJobDetailView",
+                name="shuup_product_variations.combinations_job"
+            ),
             admin_url(
                 r"^shuup_product_variations/(?P<pk>\d+)/product_variations/$",
                 "shuup_product_variations.admin.views.product_variations.ProductVariationsView",
                 name="shuup_product_variations.product.variations"
             ),
+            admin_url(
+                r"^shuup_product_variations/(?P<pk>\d+)/product_variations/translations/$",
+                "shuup_product_variations.admin.views.product_variations.ProductVariationsTranslationsView",
+                name="shuup_product_variations.product.variations_translations"
+            ),
+            admin_url(
+                r"^shuup_product_variations/(?P<pk>\d+)/product_variations/reorder/$",
+                "shuup_product_variations.admin.views.product_variations.ProductVariationsReorderView",
+                name="shuup_product_variations.product.variations_reorder"
+            ),
             admin_url(
                 r"^shuup_product_variations/(?P<pk>\d+)/product_variations_variable/$",
                 "shuup_product_variations.admin.views.product_variations.ProductVariationVariableDetailView",
@@ -68,6 +93,16 @@ class ProductVariationsOrganizer(AdminModule):
                 "shuup_product_variations.admin.views.variations.VariationsListView",
                 name="shuup_product_variations.variations.list"
             ),
+            admin_url(
+                r"^shuup_product_variations/variations/translations/$",
+                "shuup_product_variations.admin.views.variations.VariationsTranslationsView",
+                name="shuup_product_variations.variations.translations"
+            ),
+            admin_url(
+                r"^shuup_product_variations/variations/reorder/$",
+                "shuup_product_variations.admin.views.variations.VariationsReorderView",
+                name="shuup_product_variations.variations.reorder"
+            ),
             admin_url(
                 r"^shuup_product_variations/(?P<pk>\d+)/variations_variable/$",
                 "shuup_product_variations.admin.views.variations.VariationVariableDetailView",
@@ -78,6 +113,11 @@ class ProductVariationsOrganizer(AdminModule):
                 "shuup_product_variations.admin.views.variations.VariationVariableValueDetailView",
                 name="shuup_product_variations.variations_variable_value"
             ),
+            admin_url(
+                r"^shuup_product_variations/stats/$",
+                "shuup_product_variations.admin.views.stats.VariationsStatsView",
+                name="shuup_product_variations.stats"
+            ),
         ]
 
     def get_menu_entries(self, request):
@@ -6,21 +6,441 @@
 # This source code is licensed under the OSL-3.0 license found in the
 # LICENSE file in the root directory of this source tree.
 from decimal import Decimal
-from typing import Dict, NewType, Optional
+from typing import Dict, List, NewType, Optional, Tuple
 
 from django.core.exceptions import ValidationError
+from django.db.models import Min
+from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 from shuup.core.models import (
-    Product, ProductVariationLinkStatus, ProductVariationResult, Shop,
-    ShopProduct, Supplier
+    Product, ProductMode, ProductVariationLinkStatus, ProductVariationResult,
+    Shop, ShopProduct, Supplier
 )
 from shuup.core.models._product_variation import hash_combination
+from shuup.core.models._products import ProductLogEntry
+from shuup.core.signals import stocks_updated
+from shuup.core.utils import context_cache
+from shuup.core.utils.price_cache import bump_price_info_cache
+from shuup.utils.analog import LogEntryKind
 from shuup.utils.djangoenv import has_installed
+from shuup_product_variations.cache import bump_combinations_version
+from shuup_product_variations.utils import bulk_create_translated
 
 Combination = NewType("Combination", Dict[str, str])
 
 
+def _sku_exists_error(sku: str) -> ValidationError:
+    return ValidationError(
+        _("The SKU '{sku}' is already being used.").format(sku=sku),
+        code="sku-exists"
+    )
+
+
 class VariationUpdater():
+    #: The `PriceChanges` of the children written by `update_or_create_variations`,
+    #: `None` when they are unknown and the parent price must be recomputed
+    price_changes = None
+
+    #: The ids of the children whose link, SKU, price or stock were written by
+    #: `update_or_create_variations`, `None` when they are unknown
+    changed_product_ids = None
+
+    def update_or_create_variations(self, shop: Shop, supplier: Optional[Supplier],  # noqa (C901)
+                                    parent_shop_product: ShopProduct,
+                                    combinations_data: List[Dict]) -> List[Tuple[Product, ShopProduct]]:
+        """
+        Create or update all the given combinations at once
+
+        The combinations are resolved with a fixed number of queries
+        regardless of the amount of combinations. Returns a list of
+        `(variation_child, variation_shop_product)` in the same order
+        as `combinations_data`.
+
+        Updaters that only override `update_or_create_variation` are
+        still called once per combination. Only the links, SKUs, prices
+        and stocks that differ from the current ones are written.
+        """
+        self.price_changes = None
+        self.changed_product_ids = None
+        if type(self).update_or_create_variation is not VariationUpdater.update_or_create_variation:
+            return [
+                self.update_or_create_variation(shop, supplier, parent_shop_product, combination_data=combination_data)
+                for combination_data in combinations_data
+            ]
+
+        self.changed_product_ids = set()
+        if not combinations_data:
+            return []
+
+        parent_product = parent_shop_product.product
+        if not parent_product.is_variable_variation_parent():
+            parent_product.verify_mode()
+            parent_product.save()
+
+        combination_hashes = [
+            hash_combination(combination_data["combination_data"]["combination_pks"])
+            for combination_data in combinations_data
+        ]
+        variation_results = {
+            variation_result.combination_hash: variation_result
+            for variation_result in ProductVariationResult.objects.filter(
+                product=parent_product,
+                combination_hash__in=combination_hashes
+            ).select_related("result")
+        }
+        sku_owners = {
+            product.sku: product
+            for product in Product.objects.filter(sku__in=[data["sku"] for data in combinations_data])
+        }
+
+        # deleted products holding a SKU can be recovered as long as they
+        # belong to the same supplier or are not attached to the shop at all
+        deleted_owner_ids = [product.pk for product in sku_owners.values() if product.deleted]
+        deleted_owner_shop_products = {}
+        if deleted_owner_ids:
+            deleted_owner_shop_products = {
+                shop_product.product_id: shop_product
+                for shop_product in ShopProduct.objects.filter(
+                    shop=shop,
+                    product_id__in=deleted_owner_ids
+                ).prefetch_related("suppliers")
+            }
+
+        children = []
+        live_child_ids = set()
+        claimed_skus = set()
+        changed_children = []
+        changed_results = []
+        new_children = []
+        deleted_to_recover = []
+        # children whose prices may be cached in any shop
+        priced_product_ids = set()
+
+        for index, (combination_data, combination_hash) in enumerate(zip(combinations_data, combination_hashes)):
+            sku = combination_data["sku"]
+            if sku in claimed_skus:
+                raise _sku_exists_error(sku)
+            claimed_skus.add(sku)
+
+            sku_owner = sku_owners.get(sku)
+            variation_result = variation_results.get(combination_hash)
+            variation_child = None
+
+            if variation_result:
+                variation_child = variation_result.result
+                if sku_owner and sku_owner.pk != variation_child.pk:
+                    raise _sku_exists_error(sku)
+
+                if variation_result.status == ProductVariationLinkStatus.VISIBLE and not variation_child.deleted:
+                    live_child_ids.add(variation_child.pk)
+
+                if variation_result.status != ProductVariationLinkStatus.VISIBLE:
+                    variation_result.status = ProductVariationLinkStatus.VISIBLE
+                    changed_results.append(variation_result)
+
+                # update the SKU and bring the product from the dead when needed
+                if variation_child.sku != sku or variation_child.deleted:
+                    variation_child.sku = sku
+                    variation_child.deleted = False
+                    changed_children.append(variation_child)
+
+            elif sku_owner:
+                if not sku_owner.deleted:
+                    raise _sku_exists_error(sku)
+
+                deleted_shop_product = deleted_owner_shop_products.get(sku_owner.pk)
+                if (not deleted_shop_product
+                        or (supplier and supplier in deleted_shop_product.suppliers.all())):
+                    variation_child = sku_owner
+                    deleted_to_recover.append((index, combination_hash))
+                else:
+                    raise _sku_exists_error(sku)
+            else:
+                variation_child = build_variation_product(
+                    parent_product=parent_product,
+                    sku=sku,
+                    combination=combination_data["combination_data"]["combination_names"]
+                )
+                variation_child.variation_parent = parent_product
+                variation_child.mode = ProductMode.VARIATION_CHILD
+                # `full_clean` sends the clean signals `Product.save` would
+                variation_child.full_clean(validate_unique=False)
+                if variation_child.net_weight and variation_child.net_weight > 0:
+                    variation_child.gross_weight = max(variation_child.net_weight, variation_child.gross_weight)
+                # the slug `Product.save` would generate for the only translation
+                variation_child.slug = (slugify(variation_child.name)[:128] or None)
+                new_children.append((index, variation_child, combination_hash))
+
+            children.append(variation_child)
+
+        if changed_children:
+            Product.objects.bulk_update(changed_children, ["sku", "deleted"])
+            self.changed_product_ids.update(child.pk for child in changed_children)
+            priced_product_ids.update(child.pk for child in changed_children)
+        if changed_results:
+            ProductVariationResult.objects.bulk_update(changed_results, ["status"])
+            self.changed_product_ids.update(variation_result.result_id for variation_result in changed_results)
+
+        for index, combination_hash in deleted_to_recover:
+            children[index] = recover_deleted_product(
+                shop=shop,
+                parent_product=parent_product,
+                deleted_product=children[index],
+                combination=combinations_data[index]["combination_data"]["combination_names"],
+                combination_hash=combination_hash
+            )
+            self.changed_product_ids.add(children[index].pk)
+
+        if new_children:
+            children = self._bulk_create_children(parent_product, children, new_children)
+            self.changed_product_ids.update(children[index].pk for (index, child, combination_hash) in new_children)
+            priced_product_ids.update(children[index].pk for (index, child, combination_hash) in new_children)
+
+        variation_shop_products = self._get_or_create_shop_products(shop, children)
+        stock_counts = dict()
+        prices = dict()
+        for combination_data, variation_child, variation_shop_product in zip(
+            combinations_data, children, variation_shop_products
+        ):
+            # an omitted price keeps the current one, children without a price yet get zero
+            if combination_data.get("price") is not None:
+                prices[variation_child.pk] = Decimal(combination_data["price"])
+            elif variation_shop_product.default_price_value is None:
+                prices[variation_child.pk] = Decimal("0")
+
+            # only update stocks when there is a single supplier
+            if supplier and combination_data.get("stock_count") is not None:
+                stock_counts[variation_child.pk] = Decimal(combination_data["stock_count"])
+
+        if has_installed("shuup_multivendor") and prices:
+            prices = self._sync_supplier_prices(shop, supplier, prices)
+
+        self.price_changes = dict()
+        changed_shop_products = []
+        for variation_child, variation_shop_product in zip(children, variation_shop_products):
+            if variation_child.pk not in prices:
+                continue
+            previous_price = (
+                variation_shop_product.default_price_value if variation_child.pk in live_child_ids else None
+            )
+            self.price_changes[variation_child.pk] = (previous_price, prices[variation_child.pk])
+            if variation_shop_product.default_price_value != prices[variation_child.pk]:
+                variation_shop_product.default_price_value = prices[variation_child.pk]
+                changed_shop_products.append(variation_shop_product)
+
+        if changed_shop_products:
+            ShopProduct.objects.bulk_update(changed_shop_products, ["default_price_value"])
+            self.changed_product_ids.update(shop_product.product_id for shop_product in changed_shop_products)
+            priced_product_ids.update(shop_product.product_id for shop_product in changed_shop_products)
+
+        if stock_counts:
+            self._sync_stocks(supplier, stock_counts)
+
+        # bulk operations do not send signals, bump the caches of the whole family at once
+        if self.changed_product_ids:
+            context_cache.bump_cache_for_shop_product(parent_shop_product)
+            bump_combinations_version(parent_product.pk)
+        if priced_product_ids:
+            # the price caches are kept per shop, bump each shop of the written children once
+            shop_ids = set(
+                ShopProduct.objects.filter(product_id__in=priced_product_ids).values_list("shop_id", flat=True)
+            )
+            for shop_id in shop_ids:
+                bump_price_info_cache(shop_id)
+
+        return list(zip(children, variation_shop_products))
+
+    def _sync_supplier_prices(self, shop: Shop, supplier: Optional[Supplier],
+                              prices: Dict[int, Decimal]) -> Dict[int, Decimal]:
+        """
+        Upsert the supplier prices of the given products at once
+
+        Returns the cheapest price among all the suppliers of each product
+        which is the one stored as the shop product default price.
+        """
+        from shuup_multivendor.models import SupplierPrice
+
+        supplier_prices = {
+            supplier_price.product_id: supplier_price
+            for supplier_price in SupplierPrice.objects.filter(
+                shop=shop, supplier=supplier, product_id__in=prices.keys()
+            )
+        }
+        new_supplier_prices = []
+        changed_supplier_prices = []
+        for product_id, price in prices.items():
+            supplier_price = supplier_prices.get(product_id)
+            if not supplier_price:
+                new_supplier_prices.append(
+                    SupplierPrice(shop=shop, supplier=supplier, product_id=product_id, amount_value=price)
+                )
+            elif supplier_price.amount_value != price:
+                supplier_price.amount_value = price
+                changed_supplier_prices.append(supplier_price)
+
+        if new_supplier_prices:
+            SupplierPrice.objects.bulk_create(new_supplier_prices)
+        if changed_supplier_prices:
+            SupplierPrice.objects.bulk_update(changed_supplier_prices, ["amount_value"])
+        if self.changed_product_ids is not None:
+            self.changed_product_ids.update(
+                supplier_price.product_id for supplier_price in new_supplier_prices + changed_supplier_prices
+            )
+
+        cheapest_prices = dict(
+            SupplierPrice.objects.filter(
+                shop=shop, product_id__in=prices.keys()
+            ).order_by().values("product_id").annotate(
+                cheapest_price=Min("amount_value")
+            ).values_list("product_id", "cheapest_price")
+        )
+        return {
+            product_id: min(cheapest_prices.get(product_id, price), price)
+            for product_id, price in prices.items()
+        }
+
+    def _sync_stocks(self, supplier: Supplier, stock_counts: Dict[int, Decimal]):  # noqa (C901)
+        """
+        Adjust the stocks of the given products to the new logical counts
+
+        The current counts are read at once, and for the simple supplier
+        the adjustments and the stock counts are written in bulk, skipping
+        the products whose stocks are not managed like `adjust_stock`
+        does. The counts are moved by the same deltas the adjustments
+        record and the product caches are bumped and `stocks_updated` is
+        sent once for the batch. Products with a stock alert limit go
+        through `supplier.update_stocks` so the alerts still run. Supplier
+        modules other than the simple supplier are adjusted through their
+        own API.
+        """
+        stock_statuses = supplier.get_stock_statuses(list(stock_counts.keys()))
+        deltas = dict()
+        for product_id, new_stock_total in stock_counts.items():
+            stock_status = stock_statuses.get(product_id)
+            current_logical_count = (stock_status.logical_count if stock_status else 0)
+            if new_stock_total != current_logical_count:
+                deltas[product_id] = new_stock_total - current_logical_count
+
+        if not deltas:
+            return
+
+        if not (has_installed("shuup.simple_supplier") and supplier.module_identifier == "simple_supplier"):
+            if self.changed_product_ids is not None:
+                self.changed_product_ids.update(deltas.keys())
+            for product_id, delta in deltas.items():
+                supplier.adjust_stock(product_id, delta)
+            return
+
+        from shuup.core.suppliers.enums import StockAdjustmentType
+        from shuup.simple_supplier.models import StockAdjustment, StockCount
+
+        stock_count_objects = {
+            stock_count.product_id: stock_count
+            for stock_count in StockCount.objects.filter(supplier=supplier, product_id__in=deltas.keys())
+        }
+        for product_id, stock_count in stock_count_objects.items():
+            if not stock_count.stock_managed:
+                del deltas[product_id]
+
+        if not deltas:
+            return
+
+        if self.changed_product_ids is not None:
+            self.changed_product_ids.update(deltas.keys())
+
+        StockAdjustment.objects.bulk_create([
+            StockAdjustment(
+                supplier=supplier,
+                product_id=product_id,
+                delta=delta,
+                purchase_price_value=0,
+                type=StockAdjustmentType.INVENTORY
+            )
+            for product_id, delta in deltas.items()
+        ])
+
+        # products without a stock count yet are managed by default
+        StockCount.objects.bulk_create([
+            StockCount(supplier=supplier, product_id=product_id)
+            for product_id in deltas.keys()
+            if product_id not in stock_count_objects
+        ], ignore_conflicts=True)
+        saved_stock_counts = list(StockCount.objects.filter(supplier=supplier, product_id__in=deltas.keys()))
+
+        alert_product_ids = []
+        updated_stock_counts = []
+        for stock_count in saved_stock_counts:
+            if stock_count.alert_limit:
+                alert_product_ids.append(stock_count.product_id)
+                continue
+
+            delta = deltas[stock_count.product_id]
+            stock_count.logical_count += delta
+            stock_count.physical_count += delta
+            # the latest inventory adjustment is the one above without a purchase price
+            stock_count.stock_value_value = 0
+            updated_stock_counts.append(stock_count)
+
+        if updated_stock_counts:
+            StockCount.objects.bulk_update(
+                updated_stock_counts, ["logical_count", "physical_count", "stock_value_value"], batch_size=500
+            )
+            updated_product_ids = [stock_count.product_id for stock_count in updated_stock_counts]
+            context_cache.bump_cache_for_product(updated_product_ids)
+            stocks_updated.send(
+                type(supplier.module),
+                shops=supplier.shops.all(),
+                product_ids=updated_product_ids,
+                supplier=supplier
+            )
+
+        if alert_product_ids:
+            supplier.update_stocks(alert_product_ids)
+
+    def _bulk_create_children(self, parent_product: Product, children: List[Product],
+                              new_children: List[Tuple[int, Product, str]]) -> List[Product]:
+        """
+        Insert the new variation children along with their translations
+        and links to the parent, returning `children` with the saved instances
+        """
+        saved_children = bulk_create_translated(
+            Product,
+            [child for (index, child, combination_hash) in new_children],
+            lookup_fields=("sku",)
+        )
+        variation_results = []
+        children = list(children)
+        for (index, child, combination_hash), saved_child in zip(new_children, saved_children):
+            variation_results.append(
+                ProductVariationResult(
+                    product=parent_product,
+                    combination_hash=combination_hash,
+                    result=saved_child
+                )
+            )
+            children[index] = saved_child
+
+        ProductVariationResult.objects.bulk_create(variation_results)
+        return children
+
+    def _get_or_create_shop_products(self, shop: Shop, children: List[Product]) -> List[ShopProduct]:
+        product_ids = [child.pk for child in children]
+        shop_products = {
+            shop_product.product_id: shop_product
+            for shop_product in ShopProduct.objects.filter(shop=shop, product_id__in=product_ids)
+        }
+        missing_product_ids = [product_id for product_id in product_ids if product_id not in shop_products]
+        if missing_product_ids:
+            ShopProduct.objects.bulk_create([
+                ShopProduct(shop=shop, product_id=product_id)
+                for product_id in missing_product_ids
+            ])
+            shop_products.update({
+                shop_product.product_id: shop_product
+                for shop_product in ShopProduct.objects.filter(shop=shop, product_id__in=missing_product_ids)
+            })
+        return [shop_products[product_id] for product_id in product_ids]
+
     def update_or_create_variation(self, shop: Shop, supplier: Optional[Supplier],  # noqa (C901)
                                    parent_shop_product: ShopProduct, combination_data: Dict):
         sku = combination_data["sku"]   # type: str
@@ -104,15 +524,26 @@ class VariationUpdater():
             shop=shop,
             product=variation_child
         )[0]
-        price = Decimal(combination_data.get("price", "0"))
-        if has_installed("shuup_multivendor"):
+        if combination_data.get("price") is not None:
+            price = Decimal(combination_data["price"])
+        elif variation_shop_product.default_price_value is None:
+            price = Decimal("0")
+        else:
+            # an omitted price keeps the current one
+            price = None
+
+        if price is not None and has_installed("shuup_multivendor"):
             from shuup_multivendor.models import SupplierPrice
-            SupplierPrice.objects.update_or_create(
+            supplier_price = SupplierPrice.objects.filter(
                 shop=shop,
                 product=variation_child,
-                supplier=supplier,
-                defaults=dict(amount_value=price)
-            )
+                supplier=supplier
+            ).first()
+            if not supplier_price:
+                SupplierPrice.objects.create(shop=shop, product=variation_child, supplier=supplier, amount_value=price)
+            elif supplier_price.amount_value != price:
+                supplier_price.amount_value = price
+                supplier_price.save(update_fields=["amount_value"])
 
             # If we have multivendor feature on and product is linked to
             # multiple suppliers we always want to store cheapest price
@@ -122,14 +553,16 @@ class VariationUpdater():
             ).order_by("amount_value").first()
             price = min([cheapest_supplier_price_obj.amount_value, price])
 
-        variation_shop_product.default_price_value = price
-        variation_shop_product.save()
+        if price is not None and variation_shop_product.default_price_value != price:
+            variation_shop_product.default_price_value = price
+            variation_shop_product.save()
 
         # only update stocks when there is a single supplier
-        if supplier and combination_data.get("stock_count"):
+        if supplier and combination_data.get("stock_count") is not None:
             new_stock_total = Decimal(combination_data["stock_count"])
             current_stock_status = supplier.get_stock_status(variation_child.pk)
-            supplier.adjust_stock(variation_child.pk, new_stock_total - current_stock_status.logical_count)
+            if new_stock_total != current_stock_status.logical_count:
+                supplier.adjust_stock(variation_child.pk, new_stock_total - current_stock_status.logical_count)
 
         return (variation_child, variation_shop_product)
 
@@ -143,6 +576,47 @@ class VariationUpdater():
             status=ProductVariationLinkStatus.INVISIBLE
         )
 
+    def delete_variations(self, shop: Shop, supplier: Optional[Supplier],
+                          parent_product: Product, variation_ids: List[int]):
+        """
+        Delete all the given variations at once
+
+        The children are soft deleted and their result links hidden
+        with a fixed number of statements. Updaters that only override
+        `delete_variation` are still called once per variation.
+        """
+        if type(self).delete_variation is not VariationUpdater.delete_variation:
+            for variation in Product.objects.filter(pk__in=variation_ids):
+                self.delete_variation(shop, supplier, parent_product, variation)
+            return
+
+        live_ids = list(
+            Product.objects.filter(pk__in=variation_ids, deleted=False).values_list("pk", flat=True)
+        )
+        if live_ids:
+            Product.objects.filter(pk__in=live_ids).update(deleted=True)
+            ProductLogEntry.objects.bulk_create([
+                ProductLogEntry(
+                    target_id=product_id,
+                    message="Success! Deleted (soft).",
+                    kind=LogEntryKind.DELETION
+                )
+                for product_id in live_ids
+            ])
+            # the parent cache covers the children as well
+            context_cache.bump_cache_for_product(parent_product, shop)
+
+        ProductVariationResult.objects.filter(
+            product=parent_product,
+            result_id__in=variation_ids
+        ).exclude(
+            status=ProductVariationLinkStatus.INVISIBLE
+        ).update(
+            status=ProductVariationLinkStatus.INVISIBLE
+        )
+        # the result links are updated in bulk, without signals
+        bump_combinations_version(parent_product.pk)
+
 
 def get_variation_product_name(parent_product: Product, combination: Combination):
     variation_part = [
@@ -178,12 +652,13 @@ def recover_deleted_product(parent_product: Product,
     return deleted_product
 
 
-def create_variation_product(parent_product: Product,
-                             shop: Shop,
-                             sku: str,
-                             combination: Combination,
-                             combination_hash: str) -> Product:
-    variation_child = Product(
+def build_variation_product(parent_product: Product,
+                            sku: str,
+                            combination: Combination) -> Product:
+    """
+    Return an unsaved variation child for the given combination
+    """
+    return Product(
         name=get_variation_product_name(parent_product, combination),
         tax_class=parent_product.tax_class,
         sales_unit=parent_product.sales_unit,
@@ -196,6 +671,14 @@ def create_variation_product(parent_product: Product,
         net_weight=parent_product.net_weight,
         gross_weight=parent_product.gross_weight,
     )
+
+
+def create_variation_product(parent_product: Product,
+                             shop: Shop,
+                             sku: str,
+                             combination: Combination,
+                             combination_hash: str) -> Product:
+    variation_child = build_variation_product(parent_product, sku, combination)
     variation_child.full_clean()
     variation_child.save()
     variation_child.link_to_parent(parent_product, combination_hash=combination_hash)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import json
+
+from django.http import JsonResponse
+from django.utils.translation import ugettext_lazy as _
+from django.views.generic import DetailView
+from shuup.admin.shop_provider import get_shop
+from shuup.admin.supplier_provider import get_supplier
+from shuup_product_variations.admin.views.products import (
+    ProductCombinationsView
+)
+from shuup_product_variations.admin.views.serializers import (
+    ProductCombinationsSerializer
+)
+from shuup_product_variations.jobs import enqueue_combinations_job
+from shuup_product_variations.models import CombinationsJob
+
+
+def get_job_data(job: CombinationsJob):
+    return {
+        "id": job.pk,
+        "status": job.status.name.lower(),
+        "total": job.total,
+        "processed": job.processed,
+        "progress": (job.processed / job.total * 100.0 if job.total else 100.0),
+        "combinations": job.results or [],
+        "errors": job.errors or []
+    }
+
+
+class ProductCombinationsJobView(ProductCombinationsView):
+    """
+    Accept a full combinations payload and save it in the background
+    """
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if not instance:
+            return JsonResponse({
+                "error": _("Product not found"),
+                "code": "product-not-found"
+            }, status=404)
+
+        try:
+            combinations = json.loads(request.body)
+        except (json.decoder.JSONDecodeError, TypeError):
+            return JsonResponse({
+                "error": _("Invalid content data"),
+                "code": "invalid-content"
+            }, status=400)
+        if isinstance(combinations, list):
+            self.combinations_count = len(combinations)
+
+        # reject malformed payloads right away, the worker only deals with the database
+        serializer = ProductCombinationsSerializer(
+            data=dict(combinations=combinations),
+            context=dict(
+                product=instance,
+                shop=get_shop(request),
+                supplier=get_supplier(request)
+            )
+        )
+        if not serializer.is_valid():
+            return JsonResponse({
+                "error": serializer.errors,
+                "code": "validation-fail"
+            }, status=400)
+
+        job = CombinationsJob.objects.create(
+            shop=get_shop(request),
+            supplier=get_supplier(request),
+            product=instance,
+            created_by=request.user,
+            combinations=combinations,
+            total=len(combinations)
+        )
+        enqueue_combinations_job(job)
+        job.refresh_from_db()
+        return JsonResponse(get_job_data(job), status=202)
+
+
+class CombinationsJobDetailView(DetailView):
+    model = CombinationsJob
+
+    def get_queryset(self):
+        queryset = CombinationsJob.objects.filter(shop=get_shop(self.request))
+        supplier = get_supplier(self.request)
+        if supplier:
+            queryset = queryset.filter(supplier=supplier)
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return JsonResponse(get_job_data(self.object))
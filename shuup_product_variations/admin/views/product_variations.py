@@ -9,16 +9,25 @@ from collections import defaultdict
 
 from django.conf import settings
 from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
 from django.views.generic import DetailView
 from shuup.admin.supplier_provider import get_supplier
 from shuup.core.models import (
     Product, ProductVariationVariable, ProductVariationVariableValue
 )
+from shuup_product_variations.cache import (
+    get_etag, get_product_version, set_etag
+)
+from shuup_product_variations.combinations import (
+    invalidate_variation_combinations
+)
+from shuup_product_variations.instrumentation import InstrumentedViewMixin
 
-from .variations_base import VariationBaseDetailView
+from .serializers import ReorderSerializer, TranslationsSerializer
+from .variations_base import VariationBaseDetailView, VariationsBulkWriteMixin
 
 
-class ProductVariationsView(DetailView):
+class ProductVariationsView(InstrumentedViewMixin, DetailView):
     model = Product
 
     def get_queryset(self):
@@ -30,6 +39,11 @@ class ProductVariationsView(DetailView):
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
+        etag = get_etag("variations", get_product_version(self.object.pk))
+        not_modified_response = get_conditional_response(request, etag=etag)
+        if not_modified_response:
+            return not_modified_response
+
         variables_id_to_data = {}
         values_data = defaultdict(list)
         for variable_id, variable_order, variable_name, value_id, value_order, value_name in (
@@ -54,10 +68,30 @@ class ProductVariationsView(DetailView):
                 "id": value_id, "order": value_order, "name":  value_name
             })
 
-        return JsonResponse({
+        return set_etag(JsonResponse({
             "variables": variables_id_to_data,
             "values": values_data
-        })
+        }), etag)
+
+
+class ProductVariationsBulkView(VariationsBulkWriteMixin, ProductVariationsView):
+    def get_variation_querysets(self):
+        self.object = self.get_object()
+        return (
+            ProductVariationVariable.objects.filter(product=self.object),
+            ProductVariationVariableValue.objects.filter(variable__product=self.object)
+        )
+
+    def variations_saved(self):
+        invalidate_variation_combinations(self.object.pk)
+
+
+class ProductVariationsTranslationsView(ProductVariationsBulkView):
+    serializer_class = TranslationsSerializer
+
+
+class ProductVariationsReorderView(ProductVariationsBulkView):
+    serializer_class = ReorderSerializer
 
 
 class ProductVariationVariableDetailView(VariationBaseDetailView):
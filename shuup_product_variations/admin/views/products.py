@@ -7,27 +7,32 @@
 # LICENSE file in the root directory of this source tree.
 import json
 
-import six
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db.models import F, OuterRef, Subquery
-from django.db.models.functions import Coalesce
 from django.db.transaction import atomic
 from django.http import JsonResponse
-from django.utils.encoding import force_text
+from django.utils.cache import get_conditional_response
 from django.utils.translation import activate, get_language
 from django.utils.translation import ugettext_lazy as _
 from django.views.generic import DetailView
+from rest_framework import serializers
 from shuup.admin.shop_provider import get_shop
 from shuup.admin.supplier_provider import get_supplier
-from shuup.core.models import Product, ShopProduct
-from shuup.utils.djangoenv import has_installed
+from shuup.core.models import Product
 from shuup_product_variations.admin.views.serializers import (
-    ProductCombinationsDeleteSerializer, ProductCombinationsSerializer
+    ProductCombinationsDeleteSerializer, ProductCombinationsGenerateSerializer,
+    ProductCombinationsSerializer, ProductCombinationsSyncSerializer
 )
+from shuup_product_variations.cache import (
+    get_etag, get_product_version, set_etag
+)
+from shuup_product_variations.combinations import (
+    get_variation_combinations, is_stock_managed
+)
+from shuup_product_variations.instrumentation import InstrumentedViewMixin
 
 
-class ProductCombinationsView(DetailView):
+class ProductCombinationsView(InstrumentedViewMixin, DetailView):
     model = Product
 
     def get_queryset(self):
@@ -40,112 +45,160 @@ class ProductCombinationsView(DetailView):
 
         return queryset.distinct()
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
+    def get_page_params(self):
+        """
+        Return the `(cursor, limit)` requested for a paginated response
+        or `None` when the whole list of combinations is requested
+        """
+        cursor = self.request.GET.get("cursor")
+        limit = self.request.GET.get("limit")
+        if cursor is None and limit is None:
+            return None
+
+        max_limit = settings.SHUUP_PRODUCT_VARIATIONS_MAX_PAGE_SIZE
+        limit = int(limit) if limit else max_limit
+        if limit < 1:
+            raise ValueError("Invalid limit")
+        return (cursor or "", min(limit, max_limit))
+
+    def get_combinations_data(self, rows, stock_managed):
         combinations_data = []
         product_data = []
-        product_ids = set()
-        old_language = get_language()
-        activate(settings.PARLER_DEFAULT_LANGUAGE_CODE)
+        for row in rows:
+            combinations_data.append({
+                "product": row.product_id,
+                "sku_part": row.sku_part,
+                "hash": row.combination_hash,
+                "combination": row.combination
+            })
+            if row.shop_product_id:
+                item = {
+                    "pk": row.shop_product_id,
+                    "product_id": row.product_id,
+                    "sku": row.sku,
+                    "price": row.price
+                }
+                if stock_managed:
+                    item["stock_count"] = row.stock_count
+                product_data.append(item)
 
-        shop = get_shop(request)
-        shop_product = self.object.get_shop_instance(shop)
-        supplier = get_supplier(request)
-        if not supplier:
-            supplier = shop_product.suppliers.first()
+        return {
+            "combinations": combinations_data,
+            "product_data": product_data
+        }
 
-        if not supplier:
-            return JsonResponse({
-                "combinations": [],
-                "product_data": []
-            })
+    def get_compact_combinations_data(self, rows, stock_managed):
+        """
+        Return the combinations as a table of variables and values and
+        one array per field, the items at the same index belonging to
+        the same combination
 
-        for combination in self.object.get_all_available_combinations():
-            product_id = combination["result_product_pk"]
-            if not product_id:
-                continue
+        Each combination is given as the indexes of its values, one per
+        variable. The product fields are `None` for combinations that
+        have no shop product.
+        """
+        variables = []
+        values = []
+        variable_indexes = {}
+        value_positions = []
+        columns = dict(
+            value_indexes=[], hash=[], sku_part=[], product=[], pk=[], sku=[], price=[]
+        )
+        if stock_managed:
+            columns["stock_count"] = []
 
-            product_ids.add(product_id)
-            combinations_data.append({
-                "product": product_id,
-                "sku_part": combination["sku_part"],
-                "hash": combination["hash"],
-                "combination": {
-                    force_text(k): force_text(v)
-                    for k, v in six.iteritems(combination["variable_to_value"])
-                }
-            })
+        for row in rows:
+            for variable, value in row.combination.items():
+                if variable not in variable_indexes:
+                    variable_indexes[variable] = len(variables)
+                    variables.append(variable)
+                    values.append([])
+                    value_positions.append({})
+                variable_index = variable_indexes[variable]
+                if value not in value_positions[variable_index]:
+                    value_positions[variable_index][value] = len(values[variable_index])
+                    values[variable_index].append(value)
+
+            has_product_data = bool(row.shop_product_id)
+            columns["value_indexes"].append(row.combination)
+            columns["hash"].append(row.combination_hash)
+            columns["sku_part"].append(row.sku_part)
+            columns["product"].append(row.product_id)
+            columns["pk"].append(row.shop_product_id)
+            columns["sku"].append(row.sku if has_product_data else None)
+            columns["price"].append(row.price if has_product_data else None)
+            if stock_managed:
+                columns["stock_count"].append(row.stock_count if has_product_data else None)
+
+        # the variables are only all known once every row is seen
+        columns["value_indexes"] = [
+            [
+                value_positions[variable_index].get(combination.get(variable))
+                for variable_index, variable in enumerate(variables)
+            ]
+            for combination in columns["value_indexes"]
+        ]
+        return {
+            "format": "compact",
+            "variables": variables,
+            "values": values,
+            "combinations": columns
+        }
 
-        is_simple_supplier_installed = has_installed("shuup.simple_supplier")
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        try:
+            page_params = self.get_page_params()
+        except ValueError:
+            return JsonResponse({
+                "error": _("Invalid limit"),
+                "code": "invalid-limit"
+            }, status=400)
 
-        stock_managed = bool(
-            is_simple_supplier_installed and
-            supplier.module_identifier == "simple_supplier" and
-            supplier.stock_managed
+        response_format = request.GET.get("format")
+        if response_format not in (None, "compact"):
+            return JsonResponse({
+                "error": _("Invalid format"),
+                "code": "invalid-format"
+            }, status=400)
+        get_data = (
+            self.get_compact_combinations_data if response_format == "compact" else self.get_combinations_data
         )
 
-        is_multivendor_installed = has_installed("shuup_multivendor")
+        shop = get_shop(request)
+        shop_product = self.object.get_shop_instance(shop)
+        supplier = get_supplier(request)
+        if not supplier:
+            supplier = shop_product.suppliers.first()
 
-        base_queryset = ShopProduct.objects.filter(
-            shop=shop,
-            product_id__in=product_ids
+        etag = get_etag(
+            "combinations",
+            get_product_version(self.object.pk),
+            shop.pk,
+            (supplier.pk if supplier else ""),
+            request.GET.urlencode()
         )
-        if stock_managed and is_multivendor_installed:
-            from shuup.simple_supplier.models import StockCount
-            from shuup_multivendor.models import SupplierPrice
-            product_data = base_queryset.annotate(
-                sku=F("product__sku"),
-                price=Coalesce(
-                    Subquery(
-                        SupplierPrice.objects.filter(
-                            shop=shop, supplier=supplier, product_id=OuterRef("product_id")
-                        ).values("amount_value")[:1]
-                    ),
-                    0
-                ),
-                stock_count=Coalesce(
-                    Subquery(
-                        StockCount.objects.filter(product_id=OuterRef("product_id")).values("logical_count")[:1]
-                    ),
-                    0
-                ),
-            ).values("pk", "product_id", "sku", "price", "stock_count")
-        elif stock_managed:
-            from shuup.simple_supplier.models import StockCount
-            product_data = base_queryset.annotate(
-                sku=F("product__sku"),
-                price=F("default_price_value"),
-                stock_count=Coalesce(
-                    Subquery(
-                        StockCount.objects.filter(product_id=OuterRef("product_id")).values("logical_count")[:1]
-                    ),
-                    0
-                ),
-            ).values("pk", "product_id", "sku", "price", "stock_count")
-        elif is_multivendor_installed:
-            from shuup_multivendor.models import SupplierPrice
-            product_data = base_queryset.annotate(
-                sku=F("product__sku"),
-                price=Coalesce(
-                    Subquery(
-                        SupplierPrice.objects.filter(
-                            shop=shop, supplier=supplier, product_id=OuterRef("product_id")
-                        ).values("amount_value")[:1]
-                    ),
-                    0
-                ),
-            ).values("pk", "product_id", "sku", "price")
-        else:
-            product_data = base_queryset.annotate(
-                sku=F("product__sku"),
-                price=F("default_price_value"),
-            ).values("pk", "product_id", "sku", "price")
-
-        activate(old_language)
-        return JsonResponse({
-            "combinations": combinations_data,
-            "product_data": list(product_data)
-        })
+        not_modified_response = get_conditional_response(request, etag=etag)
+        if not_modified_response:
+            return not_modified_response
+
+        rows = []
+        next_cursor = None
+        if supplier:
+            rows = get_variation_combinations(self.object, shop, supplier)
+            if page_params:
+                # pages are ordered by the combination hash which never changes for a combination
+                cursor, limit = page_params
+                rows = list(rows.filter(combination_hash__gt=cursor)[:limit + 1])
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = rows[-1].combination_hash
+
+        self.combinations_count = len(rows)
+        response_data = get_data(rows, bool(supplier and is_stock_managed(supplier)))
+        if page_params:
+            response_data["next_cursor"] = next_cursor
+        return set_etag(JsonResponse(response_data), etag)
 
     def post(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -162,6 +215,8 @@ class ProductCombinationsView(DetailView):
                 "error": _("Invalid content data"),
                 "code": "invalid-content"
             }, status=400)
+        if isinstance(combinations, list):
+            self.combinations_count = len(combinations)
 
         # use atomic here since the serializer can create the variation variables and values
         with atomic():
@@ -192,6 +247,59 @@ class ProductCombinationsView(DetailView):
 
         return JsonResponse(serializer.validated_data)
 
+    def put(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if not instance:
+            return JsonResponse({
+                "error": _("Product not found"),
+                "code": "product-not-found"
+            }, status=404)
+
+        try:
+            combinations = json.loads(request.body)
+        except (json.decoder.JSONDecodeError, TypeError):
+            return JsonResponse({
+                "error": _("Invalid content data"),
+                "code": "invalid-content"
+            }, status=400)
+        if isinstance(combinations, list):
+            self.combinations_count = len(combinations)
+
+        serializer = ProductCombinationsSyncSerializer(
+            data=dict(combinations=combinations),
+            context=dict(
+                product=instance,
+                shop=get_shop(request),
+                supplier=get_supplier(request)
+            )
+        )
+        if not serializer.is_valid():
+            return JsonResponse({
+                "error": serializer.errors,
+                "code": "validation-fail"
+            }, status=400)
+
+        # the current combinations are compared by their names in the default language
+        old_language = get_language()
+        activate(settings.PARLER_DEFAULT_LANGUAGE_CODE)
+        try:
+            with atomic():
+                changes = serializer.save()
+        except serializers.ValidationError as exc:
+            return JsonResponse({
+                "error": exc.detail,
+                "code": "validation-fail"
+            }, status=400)
+        except ValidationError as exc:
+            return JsonResponse({
+                "error": exc.message,
+                "code": exc.code
+            }, status=400)
+        finally:
+            activate(old_language)
+
+        return JsonResponse(changes)
+
     def delete(self, request, *args, **kwargs):
         instance = self.get_object()
         if not instance:
@@ -207,6 +315,8 @@ class ProductCombinationsView(DetailView):
                 "error": _("Invalid content data"),
                 "code": "invalid-content"
             }, status=400)
+        if isinstance(combinations, list):
+            self.combinations_count = len(combinations)
 
         serializer = ProductCombinationsDeleteSerializer(
             data=dict(combinations=combinations),
@@ -234,3 +344,58 @@ class ProductCombinationsView(DetailView):
             }, status=400)
 
         return JsonResponse({})
+
+
+class ProductCombinationsGenerateView(ProductCombinationsView):
+    """
+    Generate the combinations of the given variables and values
+    that the product does not have yet
+    """
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if not instance:
+            return JsonResponse({
+                "error": _("Product not found"),
+                "code": "product-not-found"
+            }, status=404)
+
+        try:
+            data = json.loads(request.body)
+        except (json.decoder.JSONDecodeError, TypeError):
+            return JsonResponse({
+                "error": _("Invalid content data"),
+                "code": "invalid-content"
+            }, status=400)
+
+        # the existing combinations are compared by their names in the default language
+        old_language = get_language()
+        activate(settings.PARLER_DEFAULT_LANGUAGE_CODE)
+        try:
+            with atomic():
+                serializer = ProductCombinationsGenerateSerializer(
+                    data=data,
+                    context=dict(
+                        product=instance,
+                        shop=get_shop(request),
+                        supplier=get_supplier(request)
+                    )
+                )
+                if not serializer.is_valid():
+                    return JsonResponse({
+                        "error": serializer.errors,
+                        "code": "validation-fail"
+                    }, status=400)
+
+                self.combinations_count = len(serializer.validated_data["combinations"])
+                serializer.save()
+        except ValidationError as exc:
+            return JsonResponse({
+                "error": exc.message,
+                "code": exc.code
+            }, status=400)
+        finally:
+            activate(old_language)
+
+        return JsonResponse({"combinations": serializer.validated_data["combinations"]})
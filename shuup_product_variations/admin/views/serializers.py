@@ -5,6 +5,11 @@
 #
 # This source code is licensed under the OSL-3.0 license found in the
 # LICENSE file in the root directory of this source tree.
+import itertools
+from collections import OrderedDict
+from decimal import Decimal
+from string import Formatter
+
 from django.conf import settings
 from django.db.transaction import atomic
 from django.utils.text import slugify
@@ -18,9 +23,46 @@ from shuup.core.models import (
 from shuup.core.models._product_variation import hash_combination
 from shuup.utils.importing import cached_load
 from shuup_api.fields import FormattedDecimalField
+from shuup_product_variations.cache import (
+    bump_library_version, get_available_combinations, rebuild_library_snapshot
+)
+from shuup_product_variations.combinations import (
+    get_combinations_product_data, refresh_variation_combinations
+)
+from shuup_product_variations.instrumentation import instrumented_save
 from shuup_product_variations.models import (
     VariationVariable, VariationVariableValue
 )
+from shuup_product_variations.prices import (
+    recompute_parent_price, update_parent_price
+)
+from shuup_product_variations.utils import (
+    bulk_create_translated, bulk_update_translations, get_unused_identifier
+)
+
+
+def _get_variable_pks(product):
+    """
+    Map the variable names of the product in every language to their pks
+    """
+    variable_pks = dict()
+    for variable_pk, variable_name in ProductVariationVariable.objects.filter(
+        product=product
+    ).values_list("pk", "translations__name"):
+        variable_pks.setdefault(variable_name, variable_pk)
+    return variable_pks
+
+
+def _get_value_pks(product):
+    """
+    Map the `(variable_pk, value)` of the product in every language to the value pks
+    """
+    value_pks = dict()
+    for variable_pk, value_pk, variable_value in ProductVariationVariableValue.objects.filter(
+        variable__product=product
+    ).values_list("variable_id", "pk", "translations__value"):
+        value_pks.setdefault((variable_pk, variable_value), value_pk)
+    return value_pks
 
 
 class ProductCombinationDeleteSerializer(serializers.Serializer):
@@ -28,101 +70,215 @@ class ProductCombinationDeleteSerializer(serializers.Serializer):
     sku = serializers.CharField(required=False)
 
     def validate(self, data):
-        parent_product = self.context["product"]
-        variation_product = None
-        combination = data.get("combination")
-        sku = data.get("sku")
-
-        if not sku and not combination:
+        if not data.get("sku") and not data.get("combination"):
             raise serializers.ValidationError(_("Either combination or SKU must be informed."))
+        return data
 
-        if combination:
-            combination_set = dict()
 
-            for variable_name, variable_value in combination.items():
-                variable = ProductVariationVariable.objects.filter(
-                    product=parent_product,
-                    translations__name=variable_name
-                ).first()
+class ProductCombinationSerializer(serializers.Serializer):
+    combination = serializers.DictField()
+    sku = serializers.CharField()
+    price = FormattedDecimalField(required=False)
+    stock_count = serializers.IntegerField(required=False)
 
-                if not variable:
-                    continue
 
-                value = ProductVariationVariableValue.objects.filter(
-                    variable=variable,
-                    translations__value=variable_value
-                ).first()
+class ProductCombinationsSerializer(serializers.Serializer):
+    combinations = ProductCombinationSerializer(many=True)
 
-                if not value:
-                    continue
+    def _get_existing_children(self, combinations):
+        """
+        Return the pks of the children already linked to the combinations by their index
+        """
+        parent_product = self.context["product"]
+        variable_pks = _get_variable_pks(parent_product)
+        value_pks = _get_value_pks(parent_product)
+        item_hashes = dict()
+        for index, item in enumerate(combinations):
+            combination_pks = dict()
+            for variable_name, variable_value in item["combination"].items():
+                variable_pk = variable_pks.get(variable_name)
+                value_pk = value_pks.get((variable_pk, variable_value))
+                if not (variable_pk and value_pk):
+                    break
+                combination_pks[variable_pk] = value_pk
+            else:
+                item_hashes[index] = hash_combination(combination_pks)
 
-                combination_set[variable] = value
+        if not item_hashes:
+            return dict()
 
-            combination_hash = hash_combination(combination_set)
-            variation_result = ProductVariationResult.objects.filter(
+        hash_to_product_id = dict(
+            ProductVariationResult.objects.filter(
                 product=parent_product,
-                combination_hash=combination_hash
-            ).first()
+                combination_hash__in=set(item_hashes.values())
+            ).values_list("combination_hash", "result_id")
+        )
+        return {
+            index: hash_to_product_id[combination_hash]
+            for index, combination_hash in item_hashes.items()
+            if combination_hash in hash_to_product_id
+        }
 
-            variation_product = variation_result.result if variation_result else None
-        else:
-            variation_product = Product.objects.filter(
-                sku=sku,
-                variation_parent=parent_product
-            ).first()
+    def _get_recoverable_product_ids(self, deleted_product_ids):
+        """
+        Return the deleted products whose SKU can be taken over by recovering them
 
-        data["variation_product"] = variation_product
-        return data
+        Like in `VariationUpdater`, they must belong to the supplier
+        or not be attached to the shop at all.
+        """
+        if not deleted_product_ids:
+            return set()
+
+        supplier = self.context.get("supplier")
+        shop_products = ShopProduct.objects.filter(
+            shop=self.context["shop"],
+            product_id__in=deleted_product_ids
+        ).prefetch_related("suppliers")
+        if not supplier:
+            parent_shop_product = self.context["product"].get_shop_instance(self.context["shop"])
+            if parent_shop_product.suppliers.count() == 1:
+                supplier = parent_shop_product.suppliers.first()
 
+        attached_product_ids = set()
+        recoverable_product_ids = set()
+        for shop_product in shop_products:
+            attached_product_ids.add(shop_product.product_id)
+            if supplier and supplier in shop_product.suppliers.all():
+                recoverable_product_ids.add(shop_product.product_id)
+        return recoverable_product_ids | (set(deleted_product_ids) - attached_product_ids)
 
-class ProductCombinationSerializer(serializers.Serializer):
-    combination = serializers.DictField()
-    sku = serializers.CharField()
-    price = FormattedDecimalField(required=False)
-    stock_count = serializers.IntegerField(required=False)
+    def validate_combinations(self, combinations):
+        """
+        Check the SKUs of all the combinations before anything is written
 
+        A SKU can not be given twice in the payload nor be used by any
+        other product than the one of the combination, unless the other
+        product is deleted and can be recovered. The errors are given
+        per combination so all of them can be fixed at once.
+        """
+        if not combinations:
+            return combinations
+
+        existing_children = self._get_existing_children(combinations)
+        sku_owners = {
+            sku: (product_id, deleted)
+            for product_id, sku, deleted in Product.objects.filter(
+                sku__in=set(item["sku"] for item in combinations)
+            ).values_list("pk", "sku", "deleted")
+        }
+        recoverable_product_ids = self._get_recoverable_product_ids([
+            product_id
+            for (product_id, deleted) in sku_owners.values()
+            if deleted
+        ])
+
+        errors = []
+        seen_skus = set()
+        for index, item in enumerate(combinations):
+            sku = item["sku"]
+            owner_id, owner_deleted = sku_owners.get(sku, (None, False))
+            child_id = existing_children.get(index)
+
+            if sku in seen_skus:
+                errors.append({"sku": [_("The SKU '{sku}' is given to more than one combination.").format(sku=sku)]})
+            elif owner_id and (
+                (child_id and owner_id != child_id) or
+                (not child_id and (not owner_deleted or owner_id not in recoverable_product_ids))
+            ):
+                errors.append({"sku": [_("The SKU '{sku}' is already being used.").format(sku=sku)]})
+            else:
+                errors.append({})
+            seen_skus.add(sku)
 
-class ProductCombinationsSerializer(serializers.Serializer):
-    combinations = ProductCombinationSerializer(many=True)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return combinations
 
-    def _get_combination_instances(self, combination):
+    def _get_combinations_instances(self, combinations):  # noqa (C901)
         """
-        Convert the combination map of strings into map of instances
+        Convert the combination maps of strings into maps of instances
+
+        All the variables and values of the product are resolved at once
+        and the missing ones are created in bulk.
         """
         product = self.context["product"]
-        combination_pks = dict()
-        combination_names = dict()
-        # convert combination string map to variation instance map
-        for variable_name, variable_value in combination.items():
-            variable = ProductVariationVariable.objects.filter(
-                product=product,
-                translations__name=variable_name
-            ).values_list("pk", flat=True).first()
-            if not variable:
-                variable = ProductVariationVariable.objects.create(
+        variable_pks = _get_variable_pks(product)
+
+        missing_variable_names = []
+        for combination in combinations:
+            for variable_name in combination.keys():
+                if variable_name not in variable_pks and variable_name not in missing_variable_names:
+                    missing_variable_names.append(variable_name)
+
+        used_identifiers = set()
+        if missing_variable_names:
+            used_identifiers.update(
+                (None, identifier)
+                for identifier in ProductVariationVariable.objects.filter(
+                    product=product
+                ).values_list("identifier", flat=True)
+            )
+        new_variables = bulk_create_translated(
+            ProductVariationVariable,
+            [
+                ProductVariationVariable(
                     product=product,
                     name=variable_name,
-                    identifier=slugify(variable_name)
-                ).pk
-
-            value = ProductVariationVariableValue.objects.filter(
-                variable=variable,
-                translations__value=variable_value
-            ).values_list("pk", flat=True).first()
-            if not value:
-                value = ProductVariationVariableValue.objects.create(
-                    identifier=slugify(variable_value),
-                    variable_id=variable,
-                    value=variable_value
-                ).pk
+                    identifier=get_unused_identifier(variable_name, used_identifiers)
+                )
+                for variable_name in missing_variable_names
+            ],
+            lookup_fields=("product_id", "identifier")
+        )
+        for variable_name, variable in zip(missing_variable_names, new_variables):
+            variable_pks[variable_name] = variable.pk
 
-            combination_pks[variable] = value
-            combination_names[variable_name] = variable_value
-        return dict(
-            combination_pks=combination_pks,
-            combination_names=combination_names
+        value_pks = _get_value_pks(product)
+
+        missing_values = []
+        for combination in combinations:
+            for variable_name, variable_value in combination.items():
+                value_key = (variable_pks[variable_name], variable_value)
+                if value_key not in value_pks and value_key not in missing_values:
+                    missing_values.append(value_key)
+
+        used_identifiers = set()
+        if missing_values:
+            used_identifiers.update(
+                ProductVariationVariableValue.objects.filter(
+                    variable_id__in=set(variable_pk for (variable_pk, variable_value) in missing_values)
+                ).values_list("variable_id", "identifier")
+            )
+        new_values = bulk_create_translated(
+            ProductVariationVariableValue,
+            [
+                ProductVariationVariableValue(
+                    identifier=get_unused_identifier(variable_value, used_identifiers, variable_pk),
+                    variable_id=variable_pk,
+                    value=variable_value
+                )
+                for (variable_pk, variable_value) in missing_values
+            ],
+            lookup_fields=("variable_id", "identifier")
         )
+        for value_key, value in zip(missing_values, new_values):
+            value_pks[value_key] = value.pk
 
+        combinations_instances = []
+        for combination in combinations:
+            combination_pks = dict()
+            combination_names = dict()
+            for variable_name, variable_value in combination.items():
+                variable_pk = variable_pks[variable_name]
+                combination_pks[variable_pk] = value_pks[(variable_pk, variable_value)]
+                combination_names[variable_name] = variable_value
+            combinations_instances.append(dict(
+                combination_pks=combination_pks,
+                combination_names=combination_names
+            ))
+        return combinations_instances
+
+    @instrumented_save
     def save(self):
         parent_product = self.context["product"]
         shop = self.context["shop"]
@@ -130,21 +286,47 @@ class ProductCombinationsSerializer(serializers.Serializer):
         variations = []
         variation_shop_products = []
         variation_updater = cached_load("SHUUP_PRODUCT_VARIATIONS_VARIATION_UPDATER_SPEC")()
+        # the price of a parent without variations is not a price of a child yet
+        had_variations = parent_product.is_variable_variation_parent()
         with atomic():
             parent_shop_product = parent_product.get_shop_instance(shop)
             # when there is no current supplier set, use the single supplier configured for the product, if any
             if not supplier and parent_shop_product.suppliers.count() == 1:
                 supplier = parent_shop_product.suppliers.first()
 
-            for combination in self.validated_data["combinations"]:
+            combinations_data = []
+            combinations_instances = self._get_combinations_instances([
+                combination["combination"] for combination in self.validated_data["combinations"]
+            ])
+            for combination, combination_instances in zip(
+                self.validated_data["combinations"], combinations_instances
+            ):
                 combination_data = combination.copy()
-                combination_data["combination_data"] = self._get_combination_instances(combination["combination"])
-                variation_child, variation_child_shop_product = variation_updater.update_or_create_variation(
+                combination_data["combination_data"] = combination_instances
+                combinations_data.append(combination_data)
+
+            # custom updaters might only implement the single item API
+            if hasattr(variation_updater, "update_or_create_variations"):
+                results = variation_updater.update_or_create_variations(
                     shop,
                     supplier,
                     parent_shop_product,
-                    combination_data=combination_data
+                    combinations_data=combinations_data
                 )
+            else:
+                results = [
+                    variation_updater.update_or_create_variation(
+                        shop,
+                        supplier,
+                        parent_shop_product,
+                        combination_data=combination_data
+                    )
+                    for combination_data in combinations_data
+                ]
+
+            for combination, (variation_child, variation_child_shop_product) in zip(
+                self.validated_data["combinations"], results
+            ):
                 variations.append(variation_child)
                 variation_shop_products.append(variation_child_shop_product)
                 # populate the validated data with the product id
@@ -155,18 +337,362 @@ class ProductCombinationsSerializer(serializers.Serializer):
             for parent_supplier in parent_shop_product.suppliers.all():
                 parent_supplier.shop_products.add(*variation_shop_products)
 
-        cheapest_child = ShopProduct.objects.filter(
-            product__variation_parent_id=parent_product.pk
-        ).order_by("default_price_value").first()
-        parent_shop_product.default_price_value = cheapest_child.default_price_value
-        parent_shop_product.save()
+            # saving the same state again only reads
+            changed_product_ids = getattr(variation_updater, "changed_product_ids", None)
+            if had_variations and changed_product_ids is not None and not changed_product_ids:
+                return variations
+
+            price_changes = getattr(variation_updater, "price_changes", None)
+            if had_variations and price_changes is not None:
+                update_parent_price(parent_shop_product, price_changes)
+            else:
+                recompute_parent_price(parent_shop_product)
+
+            refresh_variation_combinations(parent_product, shop, supplier, product_ids=changed_product_ids)
 
         return variations
 
 
+class ProductCombinationsGenerateSerializer(serializers.Serializer):
+    """
+    Expand the given variables and values into combinations
+
+    The combinations the product already has are skipped. The others
+    are saved through `ProductCombinationsSerializer` with a SKU built
+    from `sku_pattern` and the default price and stock.
+    """
+    variables = serializers.DictField(
+        child=serializers.ListField(child=serializers.CharField(), allow_empty=False),
+        allow_empty=False
+    )
+    sku_pattern = serializers.CharField(default="{parent_sku}-{values}")
+    price = FormattedDecimalField(required=False)
+    stock_count = serializers.IntegerField(required=False)
+
+    def validate_variables(self, variables):
+        # the limits apply to the variables and values the product ends up with
+        variable_pks = _get_variable_pks(self.context["product"])
+        value_pks = _get_value_pks(self.context["product"])
+        new_variable_count = len([name for name in variables.keys() if name not in variable_pks])
+        if len(set(variable_pks.values())) + new_variable_count > settings.SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLES:
+            raise serializers.ValidationError(
+                _("At most {count} variables are allowed.").format(
+                    count=settings.SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLES
+                )
+            )
+        for variable_name, values in variables.items():
+            variable_pk = variable_pks.get(variable_name)
+            existing_value_pks = set(
+                value_pk
+                for ((value_variable_pk, value), value_pk) in value_pks.items()
+                if value_variable_pk == variable_pk
+            )
+            new_values = set(value for value in values if (variable_pk, value) not in value_pks)
+            if len(existing_value_pks) + len(new_values) > settings.SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLE_VALUES:
+                raise serializers.ValidationError(
+                    _("At most {count} values are allowed per variable.").format(
+                        count=settings.SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLE_VALUES
+                    )
+                )
+        return variables
+
+    def validate_sku_pattern(self, sku_pattern):
+        try:
+            # attribute and index lookups could fail on the actual values
+            field_names = set(
+                field_name
+                for (literal_text, field_name, format_spec, conversion) in Formatter().parse(sku_pattern)
+                if field_name is not None
+            )
+            if not field_names.issubset({"parent_sku", "values"}):
+                raise KeyError(field_names)
+            sku_pattern.format(parent_sku="", values="")
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            raise serializers.ValidationError(
+                _("Only the {parent_sku} and {values} placeholders can be used in the SKU pattern.")
+            )
+        return sku_pattern
+
+    def _get_missing_combinations(self, variables):
+        parent_product = self.context["product"]
+        existing_combinations = set(
+            frozenset(combination["variable_to_value"].items())
+            for combination in get_available_combinations(parent_product)
+            if combination["result_product_pk"]
+        )
+        variable_names = list(variables.keys())
+        for values in itertools.product(*[
+            # the same value given twice would generate the same combination twice
+            list(OrderedDict.fromkeys(variables[variable_name]))
+            for variable_name in variable_names
+        ]):
+            combination = OrderedDict(zip(variable_names, values))
+            if frozenset(combination.items()) not in existing_combinations:
+                yield combination
+
+    def validate(self, data):
+        parent_sku = self.context["product"].sku
+        combinations = []
+        skus = set()
+        for combination in self._get_missing_combinations(data["variables"]):
+            item = dict(
+                combination=combination,
+                sku=data["sku_pattern"].format(
+                    parent_sku=parent_sku,
+                    values="-".join(slugify(value) for value in combination.values())
+                )
+            )
+            # values without latin characters have an empty slug
+            if not item["sku"].strip() or item["sku"] in skus:
+                raise serializers.ValidationError({
+                    "sku_pattern": [
+                        _("The SKU pattern gives the SKU '{sku}' to several combinations or an empty SKU.").format(
+                            sku=item["sku"]
+                        )
+                    ]
+                })
+            skus.add(item["sku"])
+            if data.get("price") is not None:
+                item["price"] = data["price"]
+            if data.get("stock_count") is not None:
+                item["stock_count"] = data["stock_count"]
+            combinations.append(item)
+
+        self.combinations_serializer = ProductCombinationsSerializer(
+            data=dict(combinations=combinations),
+            context=self.context
+        )
+        if not self.combinations_serializer.is_valid():
+            errors = self.combinations_serializer.errors["combinations"]
+            if isinstance(errors, list):
+                errors = [
+                    dict(error, combination=item["combination"])
+                    for item, error in zip(combinations, errors)
+                    if error
+                ]
+            raise serializers.ValidationError({"combinations": errors})
+
+        data["combinations"] = self.combinations_serializer.validated_data["combinations"]
+        return data
+
+    @instrumented_save
+    def save(self):
+        if not self.validated_data["combinations"]:
+            return []
+        return self.combinations_serializer.save()
+
+
+class ProductCombinationsSyncSerializer(serializers.Serializer):
+    """
+    Make the combinations of the product match the given ones
+
+    The given combinations are compared to the current ones so only the
+    new and changed combinations are saved and only the missing ones
+    are deleted, all in a single transaction.
+    """
+    combinations = ProductCombinationSerializer(many=True)
+
+    def validate_combinations(self, combinations):
+        errors = []
+        seen_combinations = set()
+        for item in combinations:
+            combination_key = frozenset(item["combination"].items())
+            if combination_key in seen_combinations:
+                errors.append({"combination": [_("The combination is given more than once.")]})
+            else:
+                errors.append({})
+            seen_combinations.add(combination_key)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return combinations
+
+    def _get_supplier(self):
+        supplier = self.context.get("supplier")
+        if not supplier:
+            parent_shop_product = self.context["product"].get_shop_instance(self.context["shop"])
+            if parent_shop_product.suppliers.count() == 1:
+                supplier = parent_shop_product.suppliers.first()
+        return supplier
+
+    def _is_changed(self, item, product_data):
+        if item["sku"] != product_data.get("sku"):
+            return True
+        if item.get("price") is not None and item["price"] != product_data.get("price"):
+            return True
+        return bool(
+            item.get("stock_count") is not None and
+            "stock_count" in product_data and
+            Decimal(item["stock_count"]) != product_data["stock_count"]
+        )
+
+    def get_changes(self):
+        """
+        Return the current combinations to delete and the indexes
+        of the given combinations to create and to update
+        """
+        combinations = self.validated_data["combinations"]
+        current_combinations = {
+            frozenset(combination["variable_to_value"].items()): combination
+            for combination in get_available_combinations(self.context["product"])
+            if combination["result_product_pk"]
+        }
+        supplier = self._get_supplier()
+        product_data = dict()
+        if current_combinations:
+            product_data = {
+                item["product_id"]: item
+                for item in get_combinations_product_data(
+                    self.context["shop"],
+                    supplier,
+                    [combination["result_product_pk"] for combination in current_combinations.values()]
+                )
+            }
+
+        desired_combinations = {
+            frozenset(item["combination"].items()): index
+            for index, item in enumerate(combinations)
+        }
+        deleted_combinations = [
+            current_combinations[combination_key]
+            for combination_key in current_combinations.keys() - desired_combinations.keys()
+        ]
+        created_indexes = set()
+        updated_indexes = set()
+        for combination_key, index in desired_combinations.items():
+            if combination_key not in current_combinations:
+                created_indexes.add(index)
+            elif self._is_changed(
+                combinations[index],
+                product_data.get(current_combinations[combination_key]["result_product_pk"], {})
+            ):
+                updated_indexes.add(index)
+        return (deleted_combinations, created_indexes, updated_indexes)
+
+    @instrumented_save
+    def save(self):
+        combinations = self.validated_data["combinations"]
+        deleted_combinations, created_indexes, updated_indexes = self.get_changes()
+        changed_indexes = sorted(created_indexes | updated_indexes)
+
+        with atomic():
+            # delete first so the SKUs of the deleted combinations can be taken by the new ones
+            if deleted_combinations:
+                delete_serializer = ProductCombinationsDeleteSerializer(
+                    data=dict(combinations=[
+                        dict(combination=combination["variable_to_value"])
+                        for combination in deleted_combinations
+                    ]),
+                    context=self.context
+                )
+                if not delete_serializer.is_valid():
+                    raise serializers.ValidationError(delete_serializer.errors)
+                delete_serializer.save()
+
+            if changed_indexes:
+                combinations_serializer = ProductCombinationsSerializer(
+                    data=dict(combinations=[combinations[index] for index in changed_indexes]),
+                    context=self.context
+                )
+                if not combinations_serializer.is_valid():
+                    errors = combinations_serializer.errors["combinations"]
+                    if isinstance(errors, list):
+                        # give the errors by the index of the combination in the payload
+                        index_errors = dict(zip(changed_indexes, errors))
+                        errors = [index_errors.get(index, {}) for index in range(len(combinations))]
+                    raise serializers.ValidationError({"combinations": errors})
+                combinations_serializer.save()
+                for index, item in zip(changed_indexes, combinations_serializer.validated_data["combinations"]):
+                    combinations[index]["product_id"] = item["product_id"]
+
+        return {
+            "created": [combinations[index] for index in sorted(created_indexes)],
+            "updated": [combinations[index] for index in sorted(updated_indexes)],
+            "deleted": [
+                {
+                    "product": combination["result_product_pk"],
+                    "hash": combination["hash"],
+                    "combination": combination["variable_to_value"]
+                }
+                for combination in deleted_combinations
+            ]
+        }
+
+
 class ProductCombinationsDeleteSerializer(serializers.Serializer):
     combinations = ProductCombinationDeleteSerializer(many=True)
 
+    def _get_combination_hashes(self, combinations):
+        """
+        Return the combination hash of the items that have a combination by their index
+
+        Unknown variables and values are left out of the hash like
+        they are when deleting a single combination.
+        """
+        if not any(item.get("combination") for item in combinations):
+            return dict()
+
+        parent_product = self.context["product"]
+        variable_pks = _get_variable_pks(parent_product)
+        value_pks = _get_value_pks(parent_product)
+        item_hashes = dict()
+        for index, item in enumerate(combinations):
+            if not item.get("combination"):
+                continue
+            combination_pks = dict()
+            for variable_name, variable_value in item["combination"].items():
+                variable_pk = variable_pks.get(variable_name)
+                value_pk = value_pks.get((variable_pk, variable_value))
+                if variable_pk and value_pk:
+                    combination_pks[variable_pk] = value_pk
+            item_hashes[index] = hash_combination(combination_pks)
+        return item_hashes
+
+    def validate_combinations(self, combinations):
+        """
+        Resolve the variation products of all the combinations at once
+
+        Combinations are matched through their hash and the remaining
+        items through their SKU, unknown ones resolve to `None`.
+        """
+        parent_product = self.context["product"]
+        item_hashes = self._get_combination_hashes(combinations)
+        item_skus = {
+            index: item["sku"]
+            for index, item in enumerate(combinations)
+            if index not in item_hashes
+        }
+
+        hash_to_product_id = dict()
+        if item_hashes:
+            hash_to_product_id = dict(
+                ProductVariationResult.objects.filter(
+                    product=parent_product,
+                    combination_hash__in=set(item_hashes.values())
+                ).values_list("combination_hash", "result_id")
+            )
+
+        sku_to_product_id = dict()
+        if item_skus:
+            sku_to_product_id = dict(
+                Product.objects.filter(
+                    sku__in=set(item_skus.values()),
+                    variation_parent=parent_product
+                ).values_list("sku", "pk")
+            )
+
+        product_ids = dict()
+        for index, combination_hash in item_hashes.items():
+            product_ids[index] = hash_to_product_id.get(combination_hash)
+        for index, sku in item_skus.items():
+            product_ids[index] = sku_to_product_id.get(sku)
+
+        products = Product.objects.in_bulk([product_id for product_id in product_ids.values() if product_id])
+        for index, item in enumerate(combinations):
+            item["variation_product"] = products.get(product_ids[index])
+        return combinations
+
+    @instrumented_save
     def save(self):
         parent_product = self.context["product"]
         shop = self.context["shop"]
@@ -174,32 +700,37 @@ class ProductCombinationsDeleteSerializer(serializers.Serializer):
 
         with atomic():
             variation_updater = cached_load("SHUUP_PRODUCT_VARIATIONS_VARIATION_UPDATER_SPEC")()
-            hash_to_variable_value = dict()
-
-            for combination in parent_product.get_all_available_combinations():
-                hash_to_variable_value[combination["hash"]] = combination["variable_to_value"]
-
-            for combination in self.validated_data["combinations"]:
-                if combination["variation_product"]:
-                    variation_updater.delete_variation(
-                        shop,
-                        supplier,
-                        parent_product,
-                        combination["variation_product"],
-                    )
+            deleted_product_ids = [
+                combination["variation_product"].pk
+                for combination in self.validated_data["combinations"]
+                if combination["variation_product"]
+            ]
+            price_changes = {
+                product_id: (price, None)
+                for product_id, price in ShopProduct.objects.filter(
+                    shop=shop,
+                    product_id__in=deleted_product_ids,
+                    product__deleted=False
+                ).values_list("product_id", "default_price_value")
+            }
+            variation_updater.delete_variations(shop, supplier, parent_product, deleted_product_ids)
 
             # discover which variables and values are being used
-            visible_combinations_hashes = ProductVariationResult.objects.filter(
-                product=parent_product,
-                status=ProductVariationLinkStatus.VISIBLE
-            ).values_list("combination_hash", flat=True)
+            visible_combinations_hashes = set(
+                ProductVariationResult.objects.filter(
+                    product=parent_product,
+                    status=ProductVariationLinkStatus.VISIBLE
+                ).values_list("combination_hash", flat=True)
+            )
             used_variables_ids = set()
             used_values_ids = set()
 
-            for used_hash in visible_combinations_hashes:
-                for variable, value in hash_to_variable_value.get(used_hash, {}).items():
-                    used_variables_ids.add(variable.pk)
-                    used_values_ids.add(value.pk)
+            # when every combination is gone there is no need to look into the matrix
+            if visible_combinations_hashes:
+                for combination in get_available_combinations(parent_product):
+                    if combination["hash"] in visible_combinations_hashes:
+                        used_variables_ids.update(combination["variable_value_pks"].keys())
+                        used_values_ids.update(combination["variable_value_pks"].values())
 
             # delete all variables and values not being used
             ProductVariationVariableValue.objects.filter(
@@ -209,10 +740,17 @@ class ProductCombinationsDeleteSerializer(serializers.Serializer):
                 product=parent_product
             ).exclude(pk__in=used_variables_ids).delete()
 
+            if price_changes:
+                parent_shop_product = parent_product.get_shop_instance(shop)
+                update_parent_price(parent_shop_product, price_changes)
+
+            refresh_variation_combinations(parent_product, shop, supplier, product_ids=deleted_product_ids)
+
 
 class OrderingSerializer(serializers.Serializer):
     ordering = serializers.IntegerField()
 
+    @instrumented_save
     def save(self):
         item = self.context["item"]
         item.ordering = self.validated_data["ordering"]
@@ -224,6 +762,7 @@ class TranslationSerializer(serializers.Serializer):
     language_code = serializers.CharField()
     name = serializers.CharField()
 
+    @instrumented_save
     def save(self):
         item = self.context["item"]
         with switch_language(item, self.validated_data["language_code"]):
@@ -235,10 +774,122 @@ class TranslationSerializer(serializers.Serializer):
         return item
 
 
+class TranslationsSerializer(serializers.Serializer):
+    """
+    Write the names of many variables and values in many languages at once
+
+    The names are given as `{id: {language_code: name}}` and the ids must
+    be found in the `variables` and `values` querysets of the context.
+    """
+    variables = serializers.DictField(child=serializers.DictField(child=serializers.CharField()), required=False)
+    values = serializers.DictField(child=serializers.DictField(child=serializers.CharField()), required=False)
+
+    def _validate_items(self, items, queryset):
+        language_codes = set(language_code for (language_code, language_name) in settings.LANGUAGES)
+        try:
+            items = {int(item_id): translations for item_id, translations in items.items()}
+        except ValueError:
+            raise serializers.ValidationError(_("The ids must be integers."))
+
+        for translations in items.values():
+            invalid_language_codes = set(translations.keys()) - language_codes
+            if invalid_language_codes:
+                raise serializers.ValidationError(
+                    _("Invalid language codes: {codes}.").format(codes=", ".join(sorted(invalid_language_codes)))
+                )
+
+        missing_ids = set(items.keys()) - set(queryset.filter(pk__in=items.keys()).values_list("pk", flat=True))
+        if missing_ids:
+            raise serializers.ValidationError(
+                _("Items not found: {ids}.").format(ids=", ".join(str(item_id) for item_id in sorted(missing_ids)))
+            )
+        return items
+
+    def validate_variables(self, variables):
+        return self._validate_items(variables, self.context["variables"])
+
+    def validate_values(self, values):
+        return self._validate_items(values, self.context["values"])
+
+    @instrumented_save
+    def save(self):
+        with atomic():
+            written = bulk_update_translations(
+                self.context["variables"].model,
+                {
+                    variable_id: {language_code: {"name": name} for language_code, name in translations.items()}
+                    for variable_id, translations in self.validated_data.get("variables", {}).items()
+                }
+            )
+            written += bulk_update_translations(
+                self.context["values"].model,
+                {
+                    value_id: {language_code: {"value": name} for language_code, name in translations.items()}
+                    for value_id, translations in self.validated_data.get("values", {}).items()
+                }
+            )
+        return written
+
+
+class ReorderSerializer(serializers.Serializer):
+    """
+    Set the ordering of the variables or of the values of one variable
+
+    Either `variables` or `values` is given as the list of ids in their
+    new order. The ids must be found in the `variables` or `values`
+    querysets of the context and only the changed positions are written.
+    """
+    variables = serializers.ListField(child=serializers.IntegerField(), required=False)
+    values = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def _validate_ids(self, item_ids, queryset):
+        if len(set(item_ids)) != len(item_ids):
+            raise serializers.ValidationError(_("The same id is given more than once."))
+        missing_ids = set(item_ids) - set(queryset.filter(pk__in=item_ids).values_list("pk", flat=True))
+        if missing_ids:
+            raise serializers.ValidationError(
+                _("Items not found: {ids}.").format(ids=", ".join(str(item_id) for item_id in sorted(missing_ids)))
+            )
+        return item_ids
+
+    def validate_variables(self, variables):
+        return self._validate_ids(variables, self.context["variables"])
+
+    def validate_values(self, values):
+        values = self._validate_ids(values, self.context["values"])
+        variable_ids = set(self.context["values"].filter(pk__in=values).values_list("variable_id", flat=True))
+        if len(variable_ids) > 1:
+            raise serializers.ValidationError(_("The values must belong to the same variable."))
+        return values
+
+    def validate(self, data):
+        if ("variables" in data) == ("values" in data):
+            raise serializers.ValidationError(_("Either variables or values must be informed."))
+        return data
+
+    @instrumented_save
+    def save(self):
+        queryset = (self.context["variables"] if "variables" in self.validated_data else self.context["values"])
+        item_ids = self.validated_data.get("variables", self.validated_data.get("values"))
+        items = queryset.filter(pk__in=item_ids).only("pk", "ordering").in_bulk()
+
+        changed_items = []
+        for ordering, item_id in enumerate(item_ids):
+            item = items[item_id]
+            if item.ordering != ordering:
+                item.ordering = ordering
+                changed_items.append(item)
+
+        if changed_items:
+            queryset.model.objects.bulk_update(changed_items, ["ordering"])
+        return len(changed_items)
+
+
 class VariableVariableSerializer(serializers.Serializer):
     name = serializers.CharField()
     values = serializers.ListField(child=serializers.CharField())
 
+    @instrumented_save
     def save(self):
         name = self.validated_data["name"]
         variable = VariationVariable.objects.filter(
@@ -250,23 +901,43 @@ class VariableVariableSerializer(serializers.Serializer):
                 identifier=slugify(name), name=name,
             )
 
-        seen_value_ids = set()
-        for value in self.validated_data["values"]:
-            variable_value = VariationVariableValue.objects.filter(
-                variable_id=variable.pk,
-                translations__language_code=settings.PARLER_DEFAULT_LANGUAGE_CODE,
-                translations__value=value
-            ).first()
-            if not variable_value:
-                variable_value = VariationVariableValue.objects.create(
-                    identifier=slugify(value), variable_id=variable.pk, value=value,
+        # all the values of the variable are compared by their name in the default language
+        value_ids = set()
+        value_pks = dict()
+        used_identifiers = set()
+        for value_pk, identifier, language_code, value in VariationVariableValue.objects.filter(
+            variable_id=variable.pk
+        ).values_list("pk", "identifier", "translations__language_code", "translations__value"):
+            value_ids.add(value_pk)
+            used_identifiers.add((None, identifier))
+            if language_code == settings.PARLER_DEFAULT_LANGUAGE_CODE:
+                value_pks.setdefault(value, value_pk)
+
+        missing_values = list(OrderedDict.fromkeys(
+            value for value in self.validated_data["values"] if value not in value_pks
+        ))
+        new_values = bulk_create_translated(
+            VariationVariableValue,
+            [
+                VariationVariableValue(
+                    identifier=get_unused_identifier(value, used_identifiers),
+                    variable_id=variable.pk,
+                    value=value
                 )
-            seen_value_ids.add(variable_value.pk)
+                for value in missing_values
+            ],
+            lookup_fields=("variable_id", "identifier")
+        )
 
         # Delete unseeen values
-        VariationVariableValue.objects.filter(
-            variable_id=variable.pk
-        ).exclude(pk__in=seen_value_ids).delete()
+        unseen_value_ids = value_ids - set(value_pks.get(value) for value in self.validated_data["values"])
+        if unseen_value_ids:
+            VariationVariableValue.objects.filter(pk__in=unseen_value_ids).delete()
+
+        # values inserted in bulk do not send the signals
+        if new_values:
+            bump_library_version()
+        rebuild_library_snapshot()
 
         return {
             "id": variable.pk,
@@ -278,6 +949,7 @@ class VariableVariableSerializer(serializers.Serializer):
 class VariableVariableDeleteSerializer(serializers.Serializer):
     name = serializers.CharField()
 
+    @instrumented_save
     def save(self):
         name = self.validated_data["name"]
         variable = VariationVariable.objects.filter(
@@ -289,5 +961,6 @@ class VariableVariableDeleteSerializer(serializers.Serializer):
                 identifier=slugify(name), name=name,
             )
         variable.delete()
+        rebuild_library_snapshot()
 
         return self.validated_data
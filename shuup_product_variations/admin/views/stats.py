@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from django.http import JsonResponse
+from django.views.generic import View
+from shuup_product_variations.instrumentation import (
+    get_samples, get_summary, is_instrumentation_enabled
+)
+
+
+class VariationsStatsView(View):
+    def get(self, request, *args, **kwargs):
+        samples = get_samples()
+        return JsonResponse({
+            "enabled": is_instrumentation_enabled(),
+            "summary": get_summary(samples),
+            "samples": samples
+        })
@@ -5,62 +5,55 @@
 #
 # This source code is licensed under the OSL-3.0 license found in the
 # LICENSE file in the root directory of this source tree.
+import gzip
 import json
-from collections import defaultdict
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db.transaction import atomic
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from django.utils.translation import activate, get_language
 from django.utils.translation import ugettext_lazy as _
-from django.views.generic import ListView
+from django.views.generic import ListView, View
 from shuup.admin.shop_provider import get_shop
 from shuup.admin.supplier_provider import get_supplier
+from shuup_product_variations.cache import (
+    bump_library_version, get_etag, get_library_snapshot, get_library_version,
+    rebuild_library_snapshot, set_etag
+)
+from shuup_product_variations.instrumentation import InstrumentedViewMixin
 from shuup_product_variations.models import (
     VariationVariable, VariationVariableValue
 )
 
 from .serializers import (
+    ReorderSerializer, TranslationsSerializer,
     VariableVariableDeleteSerializer, VariableVariableSerializer
 )
-from .variations_base import VariationBaseDetailView
+from .variations_base import VariationBaseDetailView, VariationsBulkWriteMixin
 
 
-class VariationsListView(ListView):
+class VariationsListView(InstrumentedViewMixin, ListView):
     model = VariationVariableValue
 
     def get_queryset(self):
         return VariationVariableValue.objects.none()  # lol
 
     def get(self, request, *args, **kwargs):
-        variables_id_to_data = {}
-        values_data = defaultdict(list)
-        for variable_id, variable_order, variable_name, value_id, value_order, value_name in (
-            VariationVariableValue.objects
-                .language(settings.PARLER_DEFAULT_LANGUAGE_CODE)
-                .filter(
-                    variable__translations__language_code=settings.PARLER_DEFAULT_LANGUAGE_CODE,
-                    translations__language_code=settings.PARLER_DEFAULT_LANGUAGE_CODE
-                )
-                .values_list(
-                    "variable_id",
-                    "variable__ordering",
-                    "variable__translations__name",
-                    "pk",
-                    "ordering",
-                    "translations__value"
-                ).distinct()
-        ):
-            variables_id_to_data[variable_id] = {"name": variable_name, "order": variable_order}
-            values_data[variable_id].append({
-                "id": value_id, "order": value_order, "name":  value_name
-            })
-
-        return JsonResponse({
-            "variables": variables_id_to_data,
-            "values": values_data
-        })
+        etag = get_etag("library", get_library_version())
+        not_modified_response = get_conditional_response(request, etag=etag)
+        if not_modified_response:
+            return not_modified_response
+
+        snapshot = get_library_snapshot()
+        if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+            response = HttpResponse(snapshot, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(gzip.decompress(snapshot), content_type="application/json")
+        patch_vary_headers(response, ("Accept-Encoding",))
+        return set_etag(response, etag)
 
     def post(self, request, *args, **kwargs):
         try:
@@ -100,6 +93,23 @@ class VariationsListView(ListView):
         return JsonResponse(serializer.validated_data)
 
 
+class VariationsBulkView(VariationsBulkWriteMixin, InstrumentedViewMixin, View):
+    def get_variation_querysets(self):
+        return (VariationVariable.objects.all(), VariationVariableValue.objects.all())
+
+    def variations_saved(self):
+        bump_library_version()
+        rebuild_library_snapshot()
+
+
+class VariationsTranslationsView(VariationsBulkView):
+    serializer_class = TranslationsSerializer
+
+
+class VariationsReorderView(VariationsBulkView):
+    serializer_class = ReorderSerializer
+
+
 class VariationVariableDetailView(VariationBaseDetailView):
     model = VariationVariable
 
@@ -16,9 +16,60 @@ from parler.utils.context import switch_language
 from shuup_product_variations.admin.views.serializers import (
     OrderingSerializer, TranslationSerializer
 )
+from shuup_product_variations.cache import rebuild_library_snapshot
+from shuup_product_variations.instrumentation import InstrumentedViewMixin
+from shuup_product_variations.models import (
+    VariationVariable, VariationVariableValue
+)
+
+
+class VariationsBulkWriteMixin(object):
+    """
+    Write many variables and values in a single request
 
+    Views define the serializer, the variables and values it can write
+    and what to do once they are written.
+    """
+    http_method_names = ["post"]
+    serializer_class = None
 
-class VariationBaseDetailView(DetailView):
+    def get_variation_querysets(self):
+        """
+        Return the querysets of the variables and values that can be written
+        """
+        raise NotImplementedError()
+
+    def variations_saved(self):
+        pass
+
+    def post(self, request, *args, **kwargs):
+        try:
+            data = json.loads(request.body)
+        except (json.decoder.JSONDecodeError, TypeError):
+            return JsonResponse({
+                "error": _("Invalid content data"),
+                "code": "invalid-content"
+            }, status=400)
+
+        variables, values = self.get_variation_querysets()
+        serializer = self.serializer_class(
+            data=data,
+            context=dict(variables=variables, values=values)
+        )
+        if not serializer.is_valid():
+            return JsonResponse({
+                "error": serializer.errors,
+                "code": "validation-fail"
+            }, status=400)
+
+        written = serializer.save()
+        # bulk writes do not send signals
+        if written:
+            self.variations_saved()
+        return JsonResponse({"written": written})
+
+
+class VariationBaseDetailView(InstrumentedViewMixin, DetailView):
 
     def post(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -59,6 +110,9 @@ class VariationBaseDetailView(DetailView):
                 "code": exc.code
             }, status=400)
 
+        if isinstance(instance, (VariationVariable, VariationVariableValue)):
+            rebuild_library_snapshot()
+
         return JsonResponse({})
 
     def get(self, request, *args, **kwargs):
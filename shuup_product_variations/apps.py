@@ -23,3 +23,7 @@ class AppConfig(shuup.apps.AppConfig):
 
         ]
     }
+
+    def ready(self):
+        super(AppConfig, self).ready()
+        import shuup_product_variations.signal_handlers  # noqa (F401)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import gzip
+import hashlib
+import json
+import threading
+import uuid
+from collections import defaultdict, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.utils.encoding import force_bytes, force_text
+from django.utils.http import quote_etag
+from django.utils.translation import get_language
+from shuup.core.models import Currency
+from shuup_product_variations.models import VariationVariableValue
+
+PRODUCT_VERSION_KEY = "shuup_product_variations:version:product:%d"
+COMBINATIONS_VERSION_KEY = "shuup_product_variations:version:combinations:%d"
+LIBRARY_VERSION_KEY = "shuup_product_variations:version:library"
+CURRENCIES_VERSION_KEY = "shuup_product_variations:version:currencies"
+COMBINATIONS_KEY = "shuup_product_variations:combinations:%d:%s:%s"
+COMBINATION_ROWS_BUILT_KEY = "shuup_product_variations:combination_rows_built:%d:%d:%d"
+LIBRARY_SNAPSHOT_KEY = "shuup_product_variations:library:%s"
+
+
+def _get_version(key: str) -> str:
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, None)
+    return version
+
+
+def _bump_version(key: str):
+    cache.set(key, uuid.uuid4().hex, None)
+    # readers could cache the old state under the new version before the write
+    # is committed, so bump it again once the transaction is over
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def get_product_version(product_id: int) -> str:
+    """
+    Return the version token of the variations of the given parent product
+
+    The token changes whenever the variables, values, combinations
+    or the children of the product are written.
+    """
+    return _get_version(PRODUCT_VERSION_KEY % product_id)
+
+
+def bump_product_version(product_id: int):
+    _bump_version(PRODUCT_VERSION_KEY % product_id)
+
+
+def get_combinations_version(product_id: int) -> str:
+    """
+    Return the version token of the combination matrix of the given parent product
+
+    The token changes whenever the variables, values or results of the
+    product change. Bumping it also bumps the version of the product.
+    """
+    return _get_version(COMBINATIONS_VERSION_KEY % product_id)
+
+
+def bump_combinations_version(product_id: int):
+    _bump_version(COMBINATIONS_VERSION_KEY % product_id)
+    bump_product_version(product_id)
+
+
+def get_library_version() -> str:
+    """
+    Return the version token of the global variation library
+    """
+    return _get_version(LIBRARY_VERSION_KEY)
+
+
+def bump_library_version():
+    _bump_version(LIBRARY_VERSION_KEY)
+
+
+def bump_currencies_version():
+    _bump_version(CURRENCIES_VERSION_KEY)
+
+
+def get_etag(*parts) -> str:
+    return quote_etag(hashlib.sha1(force_bytes(":".join(str(part) for part in parts))).hexdigest())
+
+
+def set_etag(response, etag: str):
+    """
+    Set the ETag of the response and make browsers revalidate it on every use
+    """
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class _LRUCache(object):
+    def __init__(self, size_setting: str):
+        self._size_setting = size_setting
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > getattr(settings, self._size_setting):
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_combinations_lru = _LRUCache("SHUUP_PRODUCT_VARIATIONS_COMBINATIONS_LRU_SIZE")
+_currencies_lru = _LRUCache("SHUUP_PRODUCT_VARIATIONS_CURRENCIES_LRU_SIZE")
+
+
+def get_available_combinations(product):
+    """
+    Return the available combinations of the given parent product
+
+    Works like `Product.get_all_available_combinations` but the
+    variables and values are given as names in the active language
+    (`variable_to_value`) and as primary keys (`variable_value_pks`).
+    Results are kept in an in-process LRU and in the Django cache
+    until the combinations version of the product is bumped.
+    """
+    key = COMBINATIONS_KEY % (product.pk, get_combinations_version(product.pk), get_language())
+    combinations = _combinations_lru.get(key)
+    if combinations is not None:
+        return combinations
+
+    combinations = cache.get(key)
+    if combinations is None:
+        combinations = [
+            {
+                "hash": combination["hash"],
+                "result_product_pk": combination["result_product_pk"],
+                "sku_part": combination["sku_part"],
+                "variable_to_value": {
+                    force_text(variable): force_text(value)
+                    for variable, value in combination["variable_to_value"].items()
+                },
+                "variable_value_pks": {
+                    variable.pk: value.pk
+                    for variable, value in combination["variable_to_value"].items()
+                }
+            }
+            for combination in product.get_all_available_combinations()
+        ]
+        cache.set(key, combinations, settings.SHUUP_PRODUCT_VARIATIONS_COMBINATIONS_CACHE_TIMEOUT)
+
+    _combinations_lru.set(key, combinations)
+    return combinations
+
+
+def get_currency_data(code: str):
+    """
+    Return the `code` and `decimal_places` of the currency with the given code
+
+    Currencies are kept in an in-process LRU until any currency is written.
+    """
+    key = (code, _get_version(CURRENCIES_VERSION_KEY))
+    currency_data = _currencies_lru.get(key)
+    if currency_data is None:
+        currency = Currency.objects.filter(code=code).first()
+        currency_data = {
+            "code": (currency.code if currency else code),
+            "decimal_places": (currency.decimal_places if currency else 2)
+        }
+        _currencies_lru.set(key, currency_data)
+    return currency_data
+
+
+def _get_library_data():
+    variables_id_to_data = {}
+    values_data = defaultdict(list)
+    for variable_id, variable_order, variable_name, value_id, value_order, value_name in (
+        VariationVariableValue.objects
+            .language(settings.PARLER_DEFAULT_LANGUAGE_CODE)
+            .filter(
+                variable__translations__language_code=settings.PARLER_DEFAULT_LANGUAGE_CODE,
+                translations__language_code=settings.PARLER_DEFAULT_LANGUAGE_CODE
+            )
+            .values_list(
+                "variable_id",
+                "variable__ordering",
+                "variable__translations__name",
+                "pk",
+                "ordering",
+                "translations__value"
+            ).distinct()
+    ):
+        variables_id_to_data[variable_id] = {"name": variable_name, "order": variable_order}
+        values_data[variable_id].append({
+            "id": value_id, "order": value_order, "name": value_name
+        })
+
+    return {
+        "variables": variables_id_to_data,
+        "values": values_data
+    }
+
+
+def build_library_snapshot() -> bytes:
+    """
+    Serialize the variations library and store it gzipped for the current library version
+    """
+    # read the version first so a concurrent write can only make the data newer
+    key = LIBRARY_SNAPSHOT_KEY % get_library_version()
+    snapshot = gzip.compress(force_bytes(json.dumps(_get_library_data(), cls=DjangoJSONEncoder)))
+    cache.set(key, snapshot, settings.SHUUP_PRODUCT_VARIATIONS_LIBRARY_CACHE_TIMEOUT)
+    return snapshot
+
+
+def get_library_snapshot() -> bytes:
+    """
+    Return the gzipped JSON of the variations library
+
+    The snapshot is built at most once per library version.
+    """
+    snapshot = cache.get(LIBRARY_SNAPSHOT_KEY % get_library_version())
+    if snapshot is None:
+        snapshot = build_library_snapshot()
+    return snapshot
+
+
+def rebuild_library_snapshot():
+    """
+    Build the snapshot of the variations library again once the current transaction is committed
+    """
+    transaction.on_commit(build_library_snapshot)
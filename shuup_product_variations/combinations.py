@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from typing import Iterable, List, Optional, Set
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.transaction import atomic
+from django.utils.translation import override
+from shuup.core.models import Product, Shop, ShopProduct, Supplier
+from shuup.utils.djangoenv import has_installed
+from shuup_product_variations.cache import (
+    bump_combinations_version, COMBINATION_ROWS_BUILT_KEY,
+    get_available_combinations, get_combinations_version
+)
+from shuup_product_variations.models import VariationCombination
+
+
+def is_stock_managed(supplier: Supplier) -> bool:
+    return bool(
+        has_installed("shuup.simple_supplier") and
+        supplier.module_identifier == "simple_supplier" and
+        supplier.stock_managed
+    )
+
+
+def get_combinations_product_data(shop: Shop, supplier: Optional[Supplier], product_ids: Iterable[int]):
+    """
+    Return the SKU, price and stock of the given children as seen by the supplier
+
+    The stock count is only included when the supplier manages stocks.
+    Without a supplier the prices of the shop products are returned.
+    """
+    stock_managed = bool(supplier and is_stock_managed(supplier))
+    is_multivendor_installed = bool(supplier and has_installed("shuup_multivendor"))
+    fields = ["pk", "product_id", "sku", "price"]
+    annotations = dict(sku=F("product__sku"), price=F("default_price_value"))
+
+    if is_multivendor_installed:
+        from shuup_multivendor.models import SupplierPrice
+        annotations["price"] = Coalesce(
+            Subquery(
+                SupplierPrice.objects.filter(
+                    shop=shop, supplier=supplier, product_id=OuterRef("product_id")
+                ).values("amount_value")[:1]
+            ),
+            0
+        )
+
+    if stock_managed:
+        from shuup.simple_supplier.models import StockCount
+        annotations["stock_count"] = Coalesce(
+            Subquery(
+                StockCount.objects.filter(
+                    supplier=supplier, product_id=OuterRef("product_id")
+                ).values("logical_count")[:1]
+            ),
+            0
+        )
+        fields.append("stock_count")
+
+    return ShopProduct.objects.filter(
+        shop=shop,
+        product_id__in=product_ids
+    ).annotate(**annotations).values(*fields)
+
+
+def refresh_variation_combinations(parent_product: Product, shop: Shop, supplier: Supplier = None,
+                                   product_ids: Optional[Iterable[int]] = None,
+                                   suppliers: Iterable[Supplier] = ()):
+    """
+    Build the combination rows of the parent in the shop again
+
+    The rows of the given supplier or suppliers and of every supplier
+    that already has rows for the parent are built from the variations, shop
+    products, stocks and supplier prices. When `product_ids` is given
+    only the rows of those children, the rows that no longer match a
+    combination and the missing rows are written. The children are
+    shared by all shops, so their rows are then refreshed in every
+    other shop that has rows for the parent too.
+    """
+    if product_ids is not None:
+        product_ids = set(product_ids)
+
+    suppliers = list(suppliers)
+    if supplier:
+        suppliers.append(supplier)
+    _refresh_shop_combinations(parent_product, shop, suppliers, product_ids)
+
+    if product_ids is not None:
+        other_shops = Shop.objects.filter(
+            pk__in=VariationCombination.objects.filter(parent=parent_product).exclude(shop=shop).values("shop_id")
+        )
+        for other_shop in other_shops:
+            _refresh_shop_combinations(parent_product, other_shop, [], product_ids)
+
+
+def _refresh_shop_combinations(parent_product: Product, shop: Shop, extra_suppliers: List[Supplier],  # noqa (C901)
+                               product_ids: Optional[Set[int]]):
+    existing_rows = list(
+        VariationCombination.objects.filter(
+            parent=parent_product, shop=shop
+        ).values_list("pk", "supplier_id", "product_id", "combination_hash")
+    )
+    supplier_ids = set(supplier_id for (row_id, supplier_id, product_id, combination_hash) in existing_rows)
+    suppliers = (list(Supplier.objects.filter(pk__in=supplier_ids)) if supplier_ids else [])
+    for supplier in extra_suppliers:
+        if supplier.pk not in supplier_ids:
+            supplier_ids.add(supplier.pk)
+            suppliers.append(supplier)
+
+    with override(settings.PARLER_DEFAULT_LANGUAGE_CODE):
+        combinations = [
+            combination
+            for combination in get_available_combinations(parent_product)
+            if combination["result_product_pk"]
+        ]
+    combination_hashes = {
+        combination["result_product_pk"]: combination["hash"]
+        for combination in combinations
+    }
+
+    stale_row_ids = []
+    kept_rows = set()
+    if product_ids is not None:
+        for (row_id, supplier_id, product_id, combination_hash) in existing_rows:
+            if product_id in product_ids or combination_hashes.get(product_id) != combination_hash:
+                stale_row_ids.append(row_id)
+            else:
+                kept_rows.add((supplier_id, product_id))
+
+    rows = []
+    for row_supplier in suppliers:
+        missing_combinations = [
+            combination
+            for combination in combinations
+            if (row_supplier.pk, combination["result_product_pk"]) not in kept_rows
+        ]
+        if not missing_combinations:
+            continue
+
+        product_data = {
+            item["product_id"]: item
+            for item in get_combinations_product_data(
+                shop, row_supplier, [combination["result_product_pk"] for combination in missing_combinations]
+            )
+        }
+        for combination in missing_combinations:
+            item = product_data.get(combination["result_product_pk"], {})
+            rows.append(VariationCombination(
+                parent=parent_product,
+                shop=shop,
+                supplier=row_supplier,
+                product_id=combination["result_product_pk"],
+                shop_product_id=item.get("pk"),
+                combination_hash=combination["hash"],
+                value_ids=sorted(combination["variable_value_pks"].values()),
+                combination=combination["variable_to_value"],
+                sku_part=combination["sku_part"],
+                sku=item.get("sku", ""),
+                price=item.get("price"),
+                stock_count=item.get("stock_count")
+            ))
+
+    with atomic():
+        if product_ids is None:
+            VariationCombination.objects.filter(parent=parent_product, shop=shop).delete()
+        elif stale_row_ids:
+            VariationCombination.objects.filter(pk__in=stale_row_ids).delete()
+        # concurrent builds of the same parent insert each row once
+        VariationCombination.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+
+
+def invalidate_variation_combinations(parent_product_id: int):
+    """
+    Drop the cached combinations and the combination rows of the parent
+
+    The rows are built again on the next read.
+    """
+    bump_combinations_version(parent_product_id)
+    VariationCombination.objects.filter(parent_id=parent_product_id).delete()
+
+
+def get_variation_combinations(parent_product: Product, shop: Shop, supplier: Supplier):
+    """
+    Return the combination rows of the parent ordered by the combination hash
+
+    Rows that are missing, for example after the variables of the
+    parent changed, are built on the first read. Parents without any
+    combinations are only built again once their combinations change.
+    """
+    queryset = VariationCombination.objects.filter(
+        parent=parent_product,
+        shop=shop,
+        supplier=supplier
+    ).order_by("combination_hash")
+    if not parent_product.is_variable_variation_parent() or queryset.exists():
+        return queryset
+
+    built_key = COMBINATION_ROWS_BUILT_KEY % (parent_product.pk, shop.pk, supplier.pk)
+    version = get_combinations_version(parent_product.pk)
+    if cache.get(built_key) != version:
+        refresh_variation_combinations(parent_product, shop, supplier)
+        cache.set(built_key, version, None)
+    return queryset
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.utils.timezone import now
+
+_samples = None
+_samples_lock = threading.Lock()
+
+
+def is_instrumentation_enabled() -> bool:
+    return settings.SHUUP_PRODUCT_VARIATIONS_INSTRUMENTATION_ENABLED
+
+
+def _record_sample(sample):
+    global _samples
+    with _samples_lock:
+        max_samples = settings.SHUUP_PRODUCT_VARIATIONS_INSTRUMENTATION_SAMPLES
+        if _samples is None or _samples.maxlen != max_samples:
+            _samples = deque(_samples or [], maxlen=max_samples)
+        _samples.append(sample)
+
+
+def get_samples():
+    """
+    Return the recorded samples, newest first
+    """
+    with _samples_lock:
+        return list(reversed(_samples or []))
+
+
+def clear_samples():
+    with _samples_lock:
+        if _samples is not None:
+            _samples.clear()
+
+
+def get_summary(samples):
+    """
+    Aggregate the samples by kind and name
+    """
+    grouped = defaultdict(list)
+    for sample in samples:
+        grouped[(sample["kind"], sample["name"])].append(sample)
+
+    summary = []
+    for (kind, name), group in grouped.items():
+        summary.append({
+            "kind": kind,
+            "name": name,
+            "count": len(group),
+            "avg_total_time": sum(sample["total_time"] for sample in group) / len(group),
+            "max_total_time": max(sample["total_time"] for sample in group),
+            "avg_db_time": sum(sample["db_time"] for sample in group) / len(group),
+            "avg_queries": sum(sample["queries"] for sample in group) / len(group),
+            "max_queries": max(sample["queries"] for sample in group),
+        })
+    return sorted(summary, key=lambda item: item["max_total_time"], reverse=True)
+
+
+@contextmanager
+def measure(kind: str, name: str):
+    """
+    Measure the queries, DB time and total time of the block
+
+    Yields the sample dict so the block can add details to it,
+    the sample is recorded once the block exits.
+    """
+    sample = {"kind": kind, "name": name, "queries": 0, "db_time": 0.0}
+
+    def execute_wrapper(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            sample["queries"] += 1
+            sample["db_time"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(execute_wrapper):
+            yield sample
+    finally:
+        sample["total_time"] = time.perf_counter() - start
+        sample["timestamp"] = now().isoformat()
+        _record_sample(sample)
+
+
+def instrumented_save(func):
+    """
+    Decorate a serializer `save` to record a sample of every call when enabled
+    """
+    @wraps(func)
+    def save(self, *args, **kwargs):
+        if not is_instrumentation_enabled():
+            return func(self, *args, **kwargs)
+
+        with measure("serializer", "%s.save" % type(self).__name__) as sample:
+            combinations = self.validated_data.get("combinations")
+            if isinstance(combinations, list):
+                sample["combinations"] = len(combinations)
+            return func(self, *args, **kwargs)
+
+    return save
+
+
+class InstrumentedViewMixin(object):
+    """
+    Record a sample of every request handled by the view when enabled
+
+    Views can set `combinations_count` to tell how many
+    combinations the request dealt with.
+    """
+    combinations_count = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_instrumentation_enabled():
+            return super(InstrumentedViewMixin, self).dispatch(request, *args, **kwargs)
+
+        with measure("view", "%s.%s" % (type(self).__name__, request.method.lower())) as sample:
+            response = super(InstrumentedViewMixin, self).dispatch(request, *args, **kwargs)
+            sample.update(
+                path=request.path,
+                object_id=kwargs.get("pk"),
+                status=response.status_code,
+                request_size=int(request.META.get("CONTENT_LENGTH") or 0),
+                response_size=(None if response.streaming else len(response.content)),
+                combinations=self.combinations_count
+            )
+        return response
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.utils.encoding import force_text
+from django.utils.timezone import now
+from django.utils.translation import activate, get_language
+from django.utils.translation import ugettext_lazy as _
+from shuup_product_variations.models import (
+    CombinationsJob, CombinationsJobStatus
+)
+
+LOGGER = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SHUUP_PRODUCT_VARIATIONS_JOB_WORKERS,
+                thread_name_prefix="shuup_product_variations"
+            )
+    return _executor
+
+
+def enqueue_combinations_job(job: CombinationsJob):
+    """
+    Schedule the job to be processed by the local worker
+
+    The job is only handed to the worker once the current transaction
+    commits, so the worker is guaranteed to see it.
+    """
+    if settings.SHUUP_PRODUCT_VARIATIONS_RUN_JOBS_IN_BACKGROUND:
+        transaction.on_commit(lambda: get_executor().submit(_run_in_background, job.pk))
+    else:
+        process_combinations_job(job.pk)
+
+
+def _run_in_background(job_id: int):
+    try:
+        process_combinations_job(job_id)
+    finally:
+        # worker threads own their connections
+        connections.close_all()
+
+
+def process_combinations_job(job_id: int) -> bool:
+    """
+    Save all the combinations of a pending job
+
+    Returns whether the job was processed. A job is only processed once,
+    even when there are several workers trying to claim it.
+
+    Each chunk is saved in the same transaction as the progress, results
+    and errors of the job, so a job interrupted halfway resumes after the
+    last saved chunk. The job fails when any of its chunks failed, the
+    results then tell which combinations were saved.
+    """
+    from shuup_product_variations.admin.views.serializers import (
+        ProductCombinationsSerializer
+    )
+
+    claimed = CombinationsJob.objects.filter(
+        pk=job_id, status=CombinationsJobStatus.PENDING
+    ).update(status=CombinationsJobStatus.PROCESSING, modified_on=now())
+    if not claimed:
+        return False
+
+    job = CombinationsJob.objects.select_related("shop", "supplier", "product").get(pk=job_id)
+    chunk_size = settings.SHUUP_PRODUCT_VARIATIONS_JOB_CHUNK_SIZE
+    results = list(job.results or [])
+    errors = list(job.errors or [])
+    old_language = get_language()
+    activate(settings.PARLER_DEFAULT_LANGUAGE_CODE)
+
+    try:
+        for start in range(job.processed, len(job.combinations), chunk_size):
+            chunk = job.combinations[start:start + chunk_size]
+            serializer = ProductCombinationsSerializer(
+                data=dict(combinations=chunk),
+                context=dict(
+                    product=job.product,
+                    shop=job.shop,
+                    supplier=job.supplier
+                )
+            )
+            chunk_range = dict(start=start, end=start + len(chunk))
+            chunk_results = []
+            chunk_errors = []
+            with transaction.atomic():
+                if not serializer.is_valid():
+                    chunk_errors.append(dict(chunk_range, error=serializer.errors, code="validation-fail"))
+                else:
+                    try:
+                        serializer.save()
+                    except ValidationError as exc:
+                        chunk_errors.append(dict(chunk_range, error=force_text(exc.message), code=exc.code))
+                    else:
+                        chunk_results = [
+                            {
+                                "combination": combination["combination"],
+                                "sku": combination["sku"],
+                                "product_id": combination["product_id"]
+                            }
+                            for combination in serializer.validated_data["combinations"]
+                        ]
+
+                CombinationsJob.objects.filter(pk=job.pk).update(
+                    processed=start + len(chunk),
+                    results=results + chunk_results,
+                    errors=errors + chunk_errors,
+                    modified_on=now()
+                )
+            results.extend(chunk_results)
+            errors.extend(chunk_errors)
+    except Exception:
+        LOGGER.exception("Failed to process combinations job %d", job.pk)
+        errors.append({"error": force_text(_("Failed to process the combinations.")), "code": "job-failed"})
+    finally:
+        activate(old_language)
+
+    CombinationsJob.objects.filter(pk=job.pk).update(
+        status=(CombinationsJobStatus.FAILED if errors else CombinationsJobStatus.COMPLETED),
+        results=results,
+        errors=errors,
+        modified_on=now()
+    )
+    return True
+
+
+def requeue_stale_combinations_jobs() -> int:
+    """
+    Mark the jobs left processing by a worker that went away as pending
+
+    A job is considered stale when its progress has not been saved for
+    `SHUUP_PRODUCT_VARIATIONS_JOB_STALE_SECONDS`. Returns the amount of
+    jobs queued again, they resume after their last saved chunk.
+    """
+    stale_before = now() - timedelta(seconds=settings.SHUUP_PRODUCT_VARIATIONS_JOB_STALE_SECONDS)
+    return CombinationsJob.objects.filter(
+        status=CombinationsJobStatus.PROCESSING,
+        modified_on__lt=stale_before
+    ).update(status=CombinationsJobStatus.PENDING, modified_on=now())
@@ -7,31 +7,156 @@
 # LICENSE file in the root directory of this source tree.
 from django.conf import settings
 from django.core.management import BaseCommand
+from django.db.transaction import atomic
 from django.utils.text import slugify
 from django.utils.translation import activate
 from shuup.core.models import ProductVariationVariableValue
+from shuup_product_variations.cache import bump_library_version
 from shuup_product_variations.models import (
     VariationVariable, VariationVariableValue
 )
+from shuup_product_variations.utils import bulk_create_translated
+
+
+def get_key(name, identifier=None):
+    """
+    Return the key the library variables and values are matched with
+
+    Items are matched by their slug identifier and the ones that have
+    no identifier, for example names without any latin characters, by
+    their name in the default language. The identifier is slugified from
+    the name unless given.
+    """
+    identifier = (identifier if identifier is not None else slugify(name))
+    return (identifier, None) if identifier else (None, name)
 
 
 class Command(BaseCommand):
+    help = "Populate the variations library from the variables and values of the products"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Amount of rows read and inserted at once"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only report how many variables and values would be created"
+        )
 
     def handle(self, *args, **options):
         activate(settings.PARLER_DEFAULT_LANGUAGE_CODE)
+        self.batch_size = max(options["batch_size"], 1)
+        self.dry_run = options["dry_run"]
+        self.created_variables = 0
+        self.created_values = 0
 
-        for variation, variation_value in (
-            ProductVariationVariableValue.objects
-                .language()
-                .all()
-                .values_list("variable__translations__name", "translations__value")
-        ):
-            variable, created = VariationVariable.objects.get_or_create(
-                identifier=slugify(variation),
-                defaults=dict(name=variation)
+        # identifiers are matched like `get_or_create` would, the first existing row wins
+        self.variable_pks = dict()
+        for identifier, variable_pk, language_code, name in VariationVariable.objects.values_list(
+            "identifier", "pk", "translations__language_code", "translations__name"
+        ).order_by("pk"):
+            if identifier or language_code == settings.PARLER_DEFAULT_LANGUAGE_CODE:
+                self.variable_pks.setdefault(get_key(name, identifier or ""), variable_pk)
+        self.value_keys = set(
+            (variable_pk, get_key(value, identifier or ""))
+            for variable_pk, identifier, language_code, value in VariationVariableValue.objects.values_list(
+                "variable_id", "identifier", "translations__language_code", "translations__value"
             )
-            value, crated = VariationVariableValue.objects.get_or_create(
-                variable=variable,
-                identifier=slugify(variation_value),
-                defaults=dict(value=variation_value)
+            if identifier or language_code == settings.PARLER_DEFAULT_LANGUAGE_CODE
+        )
+
+        self.pending_variables = dict()
+        self.pending_values = dict()
+        processed = 0
+
+        for variable_name, variable_value in ProductVariationVariableValue.objects.values_list(
+            "variable__translations__name", "translations__value"
+        ).iterator(chunk_size=self.batch_size):
+            processed += 1
+            if variable_name and variable_value:
+                self._add_row(variable_name, variable_value)
+
+            if len(self.pending_values) >= self.batch_size:
+                self._flush()
+            if processed % self.batch_size == 0 and options["verbosity"] > 0:
+                self._report(processed)
+
+        self._flush()
+        if not self.dry_run and (self.created_variables or self.created_values):
+            # rows inserted in bulk do not send the signals
+            bump_library_version()
+
+        self._report(processed)
+
+    def _add_row(self, variable_name, variable_value):
+        variable_key = get_key(variable_name)
+        if variable_key not in self.variable_pks:
+            self.pending_variables.setdefault(variable_key, variable_name)
+
+        value_key = get_key(variable_value)
+        variable_pk = self.variable_pks.get(variable_key)
+        if (variable_key, value_key) in self.pending_values or (variable_pk, value_key) in self.value_keys:
+            return
+        self.pending_values[(variable_key, value_key)] = variable_value
+
+    def _flush(self):
+        if not self.pending_variables and not self.pending_values:
+            return
+
+        self.created_variables += len(self.pending_variables)
+        self.created_values += len(self.pending_values)
+        if self.dry_run:
+            # keep the would-be rows around so they are not counted again
+            for variable_key in self.pending_variables.keys():
+                self.variable_pks[variable_key] = variable_key
+            for (variable_key, value_key) in self.pending_values.keys():
+                self.value_keys.add((self.variable_pks[variable_key], value_key))
+            self.pending_variables = dict()
+            self.pending_values = dict()
+            return
+
+        with atomic():
+            variable_keys = list(self.pending_variables.keys())
+            variables = bulk_create_translated(
+                VariationVariable,
+                [
+                    VariationVariable(identifier=variable_key[0], name=self.pending_variables[variable_key])
+                    for variable_key in variable_keys
+                ],
+                lookup_fields=("identifier",)
             )
+            for variable_key, variable in zip(variable_keys, variables):
+                self.variable_pks[variable_key] = variable.pk
+
+            value_keys = list(self.pending_values.keys())
+            bulk_create_translated(
+                VariationVariableValue,
+                [
+                    VariationVariableValue(
+                        variable_id=self.variable_pks[variable_key],
+                        identifier=value_key[0],
+                        value=self.pending_values[(variable_key, value_key)]
+                    )
+                    for (variable_key, value_key) in value_keys
+                ],
+                lookup_fields=("variable_id", "identifier")
+            )
+            self.value_keys.update(
+                (self.variable_pks[variable_key], value_key) for (variable_key, value_key) in value_keys
+            )
+
+        self.pending_variables = dict()
+        self.pending_values = dict()
+
+    def _report(self, processed):
+        self.stdout.write("%d rows processed, %d variables and %d values %s" % (
+            processed,
+            self.created_variables,
+            self.created_values,
+            ("to create" if self.dry_run else "created")
+        ))
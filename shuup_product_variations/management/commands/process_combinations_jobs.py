@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from django.core.management import BaseCommand
+from shuup_product_variations.jobs import (
+    process_combinations_job, requeue_stale_combinations_jobs
+)
+from shuup_product_variations.models import (
+    CombinationsJob, CombinationsJobStatus
+)
+
+
+class Command(BaseCommand):
+    help = "Process the pending combination jobs, e.g. the ones left behind by a restart"
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_combinations_jobs()
+        if requeued:
+            self.stdout.write("Queued %d stale combination jobs again" % requeued)
+
+        processed = 0
+        for job_id in CombinationsJob.objects.filter(
+            status=CombinationsJobStatus.PENDING
+        ).order_by("pk").values_list("pk", flat=True):
+            if process_combinations_job(job_id):
+                processed += 1
+
+        self.stdout.write("Processed %d combination jobs" % processed)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from django.core.management import BaseCommand
+from shuup.core.models import ProductMode, ShopProduct
+from shuup_product_variations.combinations import (
+    refresh_variation_combinations
+)
+from shuup_product_variations.models import VariationCombination
+
+
+class Command(BaseCommand):
+    help = "Build the combination rows of every variation parent again"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--product",
+            type=int,
+            action="append",
+            dest="product_ids",
+            help="Only rebuild the given parent product, can be given multiple times"
+        )
+
+    def handle(self, *args, **options):
+        shop_products = ShopProduct.objects.filter(
+            product__mode=ProductMode.VARIABLE_VARIATION_PARENT,
+            product__deleted=False
+        ).select_related("product", "shop").order_by("pk")
+        stale_combinations = VariationCombination.objects.all()
+        if options["product_ids"]:
+            shop_products = shop_products.filter(product_id__in=options["product_ids"])
+            stale_combinations = stale_combinations.filter(parent_id__in=options["product_ids"])
+
+        # rows of parents that are gone are not rebuilt
+        stale_combinations.delete()
+
+        rebuilt = 0
+        for shop_product in shop_products.iterator():
+            # every supplier of the parent is built in a single pass
+            refresh_variation_combinations(
+                shop_product.product, shop_product.shop, suppliers=shop_product.suppliers.all()
+            )
+            rebuilt += 1
+            if options["verbosity"] > 1:
+                self.stdout.write("Rebuilt the combinations of %s in %s" % (shop_product.product, shop_product.shop))
+
+        self.stdout.write("%d parents rebuilt" % rebuilt)
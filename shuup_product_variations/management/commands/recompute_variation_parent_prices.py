@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from django.core.management import BaseCommand
+from django.db.models import Min
+from django.db.transaction import atomic
+from shuup.core.models import ShopProduct
+from shuup_product_variations.cache import bump_product_version
+
+
+class Command(BaseCommand):
+    help = "Set the price of every variation parent to the price of its cheapest child in each shop"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Only report the parents with a wrong price"
+        )
+
+    def handle(self, *args, **options):
+        cheapest_prices = {
+            (shop_id, parent_id): cheapest_price
+            for shop_id, parent_id, cheapest_price in ShopProduct.objects.filter(
+                product__variation_parent__isnull=False,
+                product__deleted=False
+            ).order_by().values("shop_id", "product__variation_parent_id").annotate(
+                cheapest_price=Min("default_price_value")
+            ).values_list("shop_id", "product__variation_parent_id", "cheapest_price")
+            if cheapest_price is not None
+        }
+
+        changed_shop_products = []
+        for parent_shop_product in ShopProduct.objects.filter(
+            product_id__in=set(parent_id for (shop_id, parent_id) in cheapest_prices.keys())
+        ):
+            cheapest_price = cheapest_prices.get((parent_shop_product.shop_id, parent_shop_product.product_id))
+            if cheapest_price is not None and cheapest_price != parent_shop_product.default_price_value:
+                parent_shop_product.default_price_value = cheapest_price
+                changed_shop_products.append(parent_shop_product)
+
+        if not options["dry_run"]:
+            with atomic():
+                ShopProduct.objects.bulk_update(changed_shop_products, ["default_price_value"], batch_size=500)
+            for parent_shop_product in changed_shop_products:
+                bump_product_version(parent_shop_product.product_id)
+
+        self.stdout.write("%d parent prices %s" % (
+            len(changed_shop_products), ("to update" if options["dry_run"] else "updated")
+        ))
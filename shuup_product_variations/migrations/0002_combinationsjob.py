@@ -0,0 +1,42 @@
+# Generated by Django 2.2.17 on 2026-10-18 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import enumfields.fields
+import jsonfield.fields
+import shuup_product_variations.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('shuup', '0001_initial'),
+        ('shuup_product_variations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CombinationsJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True, verbose_name='created on')),
+                ('modified_on', models.DateTimeField(auto_now=True, verbose_name='modified on')),
+                ('status', enumfields.fields.EnumIntegerField(db_index=True, default=0, enum=shuup_product_variations.models.CombinationsJobStatus, verbose_name='status')),
+                ('combinations', jsonfield.fields.JSONField(verbose_name='combinations')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='total')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='processed')),
+                ('results', jsonfield.fields.JSONField(blank=True, null=True, verbose_name='results')),
+                ('errors', jsonfield.fields.JSONField(blank=True, null=True, verbose_name='errors')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='created by')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shuup.Product', verbose_name='product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='shuup.Shop', verbose_name='shop')),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='shuup.Supplier', verbose_name='supplier')),
+            ],
+            options={
+                'verbose_name': 'combinations job',
+                'verbose_name_plural': 'combinations jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.17 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import jsonfield.fields
+import shuup.core.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shuup', '0001_initial'),
+        ('shuup_product_variations', '0002_combinationsjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariationCombination',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('combination_hash', models.CharField(max_length=40, verbose_name='combination hash')),
+                ('value_ids', jsonfield.fields.JSONField(verbose_name='value ids')),
+                ('combination', jsonfield.fields.JSONField(help_text='The variable and value names in the default language.', verbose_name='combination')),
+                ('sku_part', models.CharField(blank=True, max_length=128, verbose_name='SKU part')),
+                ('sku', models.CharField(blank=True, max_length=128, verbose_name='SKU')),
+                ('price', shuup.core.fields.MoneyValueField(blank=True, decimal_places=9, max_digits=36, null=True, verbose_name='price')),
+                ('stock_count', shuup.core.fields.QuantityField(blank=True, decimal_places=9, default=None, max_digits=36, null=True, verbose_name='stock count')),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shuup.Product', verbose_name='parent product')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shuup.Product', verbose_name='product')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shuup.Shop', verbose_name='shop')),
+                ('shop_product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shuup.ShopProduct', verbose_name='shop product')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='shuup.Supplier', verbose_name='supplier')),
+            ],
+            options={
+                'verbose_name': 'variation combination',
+                'verbose_name_plural': 'variation combinations',
+                'unique_together': {('parent', 'shop', 'supplier', 'product')},
+                'index_together': {('parent', 'shop', 'supplier', 'combination_hash')},
+            },
+        ),
+    ]
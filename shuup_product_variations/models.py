@@ -7,10 +7,15 @@
 # LICENSE file in the root directory of this source tree.
 from __future__ import unicode_literals
 
+from django.conf import settings
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
+from enumfields import Enum, EnumIntegerField
+from jsonfield import JSONField
 from parler.models import TranslatableModel, TranslatedFields
-from shuup.core.fields import InternalIdentifierField
+from shuup.core.fields import (
+    InternalIdentifierField, MoneyValueField, QuantityField
+)
 from shuup.utils.django_compat import force_text
 from shuup.utils.models import SortableMixin
 
@@ -47,3 +52,87 @@ class VariationVariableValue(TranslatableModel, SortableMixin):
 
     def __str__(self):
         return force_text(self.safe_translation_getter("value") or self.identifier or repr(self))
+
+
+class CombinationsJobStatus(Enum):
+    PENDING = 0
+    PROCESSING = 1
+    COMPLETED = 2
+    FAILED = 3
+
+    class Labels:
+        PENDING = _("pending")
+        PROCESSING = _("processing")
+        COMPLETED = _("completed")
+        FAILED = _("failed")
+
+
+class CombinationsJob(models.Model):
+    """
+    A combination save processed in the background
+
+    The combinations are stored as sent to `ProductCombinationsView`
+    and saved by a local worker, see `shuup_product_variations.jobs`.
+    """
+    shop = models.ForeignKey("shuup.Shop", on_delete=models.CASCADE, verbose_name=_("shop"))
+    supplier = models.ForeignKey(
+        "shuup.Supplier", null=True, blank=True, on_delete=models.CASCADE, verbose_name=_("supplier"))
+    product = models.ForeignKey(
+        "shuup.Product", related_name="+", on_delete=models.CASCADE, verbose_name=_("product"))
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, verbose_name=_("created by"))
+    created_on = models.DateTimeField(auto_now_add=True, verbose_name=_("created on"))
+    modified_on = models.DateTimeField(auto_now=True, verbose_name=_("modified on"))
+    status = EnumIntegerField(
+        CombinationsJobStatus, default=CombinationsJobStatus.PENDING, db_index=True, verbose_name=_("status"))
+    combinations = JSONField(verbose_name=_("combinations"))
+    total = models.PositiveIntegerField(default=0, verbose_name=_("total"))
+    processed = models.PositiveIntegerField(default=0, verbose_name=_("processed"))
+    results = JSONField(blank=True, null=True, verbose_name=_("results"))
+    errors = JSONField(blank=True, null=True, verbose_name=_("errors"))
+
+    class Meta:
+        verbose_name = _('combinations job')
+        verbose_name_plural = _('combinations jobs')
+
+    def __str__(self):
+        return force_text(_("Combinations job {pk} ({status})").format(pk=self.pk, status=self.status))
+
+
+class VariationCombination(models.Model):
+    """
+    Read model of a single combination of a variation parent
+
+    Holds one row per parent, shop, supplier and child with everything
+    `ProductCombinationsView` returns, so reading the combinations of
+    a parent is a single range scan. The rows are maintained on write,
+    see `shuup_product_variations.combinations`.
+    """
+    parent = models.ForeignKey(
+        "shuup.Product", related_name="+", on_delete=models.CASCADE, verbose_name=_("parent product"))
+    shop = models.ForeignKey("shuup.Shop", related_name="+", on_delete=models.CASCADE, verbose_name=_("shop"))
+    supplier = models.ForeignKey(
+        "shuup.Supplier", related_name="+", on_delete=models.CASCADE, verbose_name=_("supplier"))
+    product = models.ForeignKey(
+        "shuup.Product", related_name="+", on_delete=models.CASCADE, verbose_name=_("product"))
+    shop_product = models.ForeignKey(
+        "shuup.ShopProduct", related_name="+", null=True, blank=True, on_delete=models.SET_NULL,
+        verbose_name=_("shop product"))
+    combination_hash = models.CharField(max_length=40, verbose_name=_("combination hash"))
+    value_ids = JSONField(verbose_name=_("value ids"))
+    combination = JSONField(
+        verbose_name=_("combination"),
+        help_text=_("The variable and value names in the default language."))
+    sku_part = models.CharField(max_length=128, blank=True, verbose_name=_("SKU part"))
+    sku = models.CharField(max_length=128, blank=True, verbose_name=_("SKU"))
+    price = MoneyValueField(null=True, blank=True, verbose_name=_("price"))
+    stock_count = QuantityField(null=True, blank=True, default=None, verbose_name=_("stock count"))
+
+    class Meta:
+        verbose_name = _('variation combination')
+        verbose_name_plural = _('variation combinations')
+        unique_together = (("parent", "shop", "supplier", "product"), )
+        index_together = (("parent", "shop", "supplier", "combination_hash"), )
+
+    def __str__(self):
+        return force_text(self.sku or self.combination_hash)
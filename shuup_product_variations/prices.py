@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from django.db.models import Min
+from shuup.core.models import ShopProduct
+
+#: Map of child product id to its `(old price, new price)`, where
+#: the old price is `None` for new children and the new price is
+#: `None` for removed children.
+PriceChanges = Dict[int, Tuple[Optional[Decimal], Optional[Decimal]]]
+
+
+def get_cheapest_child_price(parent_shop_product: ShopProduct) -> Optional[Decimal]:
+    return ShopProduct.objects.filter(
+        shop_id=parent_shop_product.shop_id,
+        product__variation_parent_id=parent_shop_product.product_id,
+        product__deleted=False
+    ).aggregate(cheapest_price=Min("default_price_value"))["cheapest_price"]
+
+
+def _set_parent_price(parent_shop_product: ShopProduct, price: Optional[Decimal]):
+    if price is not None and price != parent_shop_product.default_price_value:
+        parent_shop_product.default_price_value = price
+        parent_shop_product.save()
+
+
+def recompute_parent_price(parent_shop_product: ShopProduct):
+    """
+    Set the price of the parent to the price of its cheapest child in the same shop
+    """
+    _set_parent_price(parent_shop_product, get_cheapest_child_price(parent_shop_product))
+
+
+def update_parent_price(parent_shop_product: ShopProduct, price_changes: PriceChanges):
+    """
+    Maintain the price of the parent from the price changes of some of its children
+
+    The children are only scanned again when the current cheapest
+    child might have been removed or made more expensive.
+    """
+    current_price = parent_shop_product.default_price_value
+    if current_price is None:
+        recompute_parent_price(parent_shop_product)
+        return
+
+    for old_price, new_price in price_changes.values():
+        if old_price == current_price and (new_price is None or new_price > old_price):
+            recompute_parent_price(parent_shop_product)
+            return
+
+    new_prices = [new_price for (old_price, new_price) in price_changes.values() if new_price is not None]
+    if new_prices and min(new_prices) < current_price:
+        _set_parent_price(parent_shop_product, min(new_prices))
@@ -5,15 +5,78 @@
 #
 # This source code is licensed under the OSL-3.0 license found in the
 # LICENSE file in the root directory of this source tree.
+from functools import lru_cache
+
 from django.conf import settings
-from django.urls import reverse
+from django.urls import get_script_prefix, get_urlconf, reverse
 from django.utils.translation import ugettext as _
 from shuup.admin.base import Section
 from shuup.admin.shop_provider import get_shop
 from shuup.admin.supplier_provider import get_supplier
-from shuup.admin.utils.permissions import has_permission
-from shuup.core.models import Currency, ProductMode
+from shuup.admin.utils.permissions import get_missing_permissions
+from shuup.core.models import ProductMode
 from shuup.utils.djangoenv import has_installed
+from shuup_product_variations.cache import get_currency_data
+from shuup_product_variations.combinations import is_stock_managed
+
+CAN_CREATE_PERMISSION = "shuup_product_variations_can_create_variations"
+CAN_EDIT_PERMISSION = "shuup_product_variations.can_edit_variations"
+
+
+@lru_cache(maxsize=None)
+def _get_url_template(url_name: str, script_prefix: str, urlconf) -> str:
+    return reverse(url_name, kwargs={"pk": 9999}, urlconf=urlconf).replace("9999", "xxxx")
+
+
+def get_url_template(url_name: str) -> str:
+    """
+    Return the URL with the given name with `xxxx` in place of the `pk`
+
+    The templates are reversed once per script prefix and URLconf
+    since both can be set per request.
+    """
+    return _get_url_template(url_name, get_script_prefix(), get_urlconf())
+
+
+def get_url(url_name: str, pk: int) -> str:
+    return get_url_template(url_name).replace("xxxx", str(pk))
+
+
+@lru_cache(maxsize=None)
+def _get_default_variations_url(script_prefix: str, urlconf) -> str:
+    return reverse("shuup_admin:shuup_product_variations.variations.list", urlconf=urlconf)
+
+
+def get_default_variations_url() -> str:
+    return _get_default_variations_url(get_script_prefix(), get_urlconf())
+
+
+def _get_request_data(request):
+    """
+    Return the lookups of the section stored in the request
+
+    The section hooks share the shop, the supplier and the shop
+    products so they are only read once per request.
+    """
+    if not hasattr(request, "_shuup_product_variations_section"):
+        request._shuup_product_variations_section = {
+            "shop": get_shop(request),
+            "supplier": get_supplier(request),
+            "products": {}
+        }
+    return request._shuup_product_variations_section
+
+
+def _get_product_data(product, request):
+    products = _get_request_data(request)["products"]
+    if product.pk not in products:
+        shop_product = product.get_shop_instance(_get_request_data(request)["shop"])
+        products[product.pk] = {
+            "shop_product": shop_product,
+            # two suppliers are enough to know whether there is a single one
+            "suppliers": list(shop_product.suppliers.all()[:2])
+        }
+    return products[product.pk]
 
 
 class ProductVariationsSection(Section):
@@ -29,19 +92,11 @@ class ProductVariationsSection(Section):
         if not product.pk:
             return False
 
-        shop = get_shop(request)
-        if not shop:
-            return False
-
-        shop_product = product.get_shop_instance(shop)
-        supplier = get_supplier(request)
-        if not supplier:
-            supplier = shop_product.suppliers.first()
-
-        if not supplier:
+        request_data = _get_request_data(request)
+        if not request_data["shop"]:
             return False
 
-        if get_supplier(request) is None and shop_product.suppliers.count() != 1:
+        if request_data["supplier"] is None and len(_get_product_data(product, request)["suppliers"]) != 1:
             return False
 
         return (
@@ -55,83 +110,64 @@ class ProductVariationsSection(Section):
     @classmethod
     def get_context_data(cls, product, request=None):
         main_product = (product.variation_parent if product.variation_parent else product)
-        shop = get_shop(request)
-        main_shop_product = main_product.get_shop_instance(shop)
-        supplier = get_supplier(request)
-        if not supplier:
-            supplier = main_shop_product.suppliers.first()
+        request_data = _get_request_data(request)
+        shop = request_data["shop"]
+        product_data = _get_product_data(main_product, request)
+        main_shop_product = product_data["shop_product"]
+        supplier = request_data["supplier"] or product_data["suppliers"][0]
 
         is_simple_supplier_installed = has_installed("shuup.simple_supplier")
 
-        stock_managed = bool(
-            is_simple_supplier_installed and
-            supplier.module_identifier == "simple_supplier" and
-            supplier.stock_managed
-        )
+        stock_managed = is_stock_managed(supplier)
 
-        currency = Currency.objects.filter(code=shop.currency).first()
+        currency = get_currency_data(shop.currency)
 
         if (
-            get_supplier(request) and
+            request_data["supplier"] and
             has_installed("shuup_multivendor") and
             settings.SHUUP_MULTIVENDOR_ENABLE_CUSTOM_PRODUCTS
         ):
-            product_url = reverse(
-                "shuup_admin:shuup_multivendor.products_edit",
-                kwargs={"pk": 9999}
-            ).replace("9999", "xxxx")
-            main_product_url = reverse(
-                "shuup_admin:shuup_multivendor.products_edit",
-                kwargs={"pk": main_shop_product.pk}
-            )
+            product_url_name = "shuup_admin:shuup_multivendor.products_edit"
         else:
-            product_url = reverse(
-                "shuup_admin:shop_product.edit",
-                kwargs={"pk": 9999}
-            ).replace("9999", "xxxx")
-            main_product_url = reverse(
-                "shuup_admin:shop_product.edit",
-                kwargs={"pk": main_shop_product.pk}
-            )
+            product_url_name = "shuup_admin:shop_product.edit"
 
-        combinations_url = reverse(
-            "shuup_admin:shuup_product_variations.product.combinations",
-            kwargs={"pk": main_product.pk}
-        )
-        default_variations_url = reverse("shuup_admin:shuup_product_variations.variations.list")
-        variations_url = reverse(
-            "shuup_admin:shuup_product_variations.product.variations",
-            kwargs={"pk": 9999}
-        ).replace("9999", "xxxx")
-        variable_url = reverse(
-            "shuup_admin:shuup_product_variations.product.variations_variable",
-            kwargs={"pk": 9999}
-        ).replace("9999", "xxxx")
-        variable_value_url = reverse(
-            "shuup_admin:shuup_product_variations.product.variations_variable_value",
-            kwargs={"pk": 9999}
-        ).replace("9999", "xxxx")
+        missing_permissions = get_missing_permissions(request.user, (CAN_CREATE_PERMISSION, CAN_EDIT_PERMISSION))
 
         return {
             "current_product_id": product.pk,
             "product_id": main_product.pk,
-            "product_url": main_product_url,
-            "product_url_template": product_url,
+            "product_url": get_url(product_url_name, main_shop_product.pk),
+            "product_url_template": get_url_template(product_url_name),
             "default_sku": main_product.sku,
             "default_price": main_shop_product.default_price_value or 0,
-            "currency": currency.code,
-            "currency_decimal_places": currency.decimal_places,
+            "currency": currency["code"],
+            "currency_decimal_places": currency["decimal_places"],
             "sales_unit": product.sales_unit.symbol,
             "sales_unit_decimal_places": product.sales_unit.decimals,
-            "can_create": has_permission(request.user, "shuup_product_variations_can_create_variations"),
-            "can_edit": has_permission(request.user, "shuup_product_variations.can_edit_variations"),
+            "can_create": CAN_CREATE_PERMISSION not in missing_permissions,
+            "can_edit": CAN_EDIT_PERMISSION not in missing_permissions,
             "max_variations": settings.SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLES,
             "max_values": settings.SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLE_VALUES,
             "stock_managed": stock_managed,
             "is_simple_supplier_installed": is_simple_supplier_installed,
-            "combinations_url": combinations_url,
-            "default_variations_url": default_variations_url,
-            "variations_url": variations_url,
-            "variable_url": variable_url,
-            "variable_value_url": variable_value_url
+            "combinations_url": get_url("shuup_admin:shuup_product_variations.product.combinations", main_product.pk),
+            "combinations_generate_url": get_url(
+                "shuup_admin:shuup_product_variations.product.combinations_generate", main_product.pk
+            ),
+            "combinations_jobs_url": get_url(
+                "shuup_admin:shuup_product_variations.product.combinations_jobs", main_product.pk
+            ),
+            "combinations_job_url": get_url_template("shuup_admin:shuup_product_variations.combinations_job"),
+            "default_variations_url": get_default_variations_url(),
+            "variations_url": get_url_template("shuup_admin:shuup_product_variations.product.variations"),
+            "variations_translations_url": get_url_template(
+                "shuup_admin:shuup_product_variations.product.variations_translations"
+            ),
+            "variations_reorder_url": get_url_template(
+                "shuup_admin:shuup_product_variations.product.variations_reorder"
+            ),
+            "variable_url": get_url_template("shuup_admin:shuup_product_variations.product.variations_variable"),
+            "variable_value_url": get_url_template(
+                "shuup_admin:shuup_product_variations.product.variations_variable_value"
+            )
         }
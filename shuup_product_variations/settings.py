@@ -21,3 +21,54 @@ SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLES = 3
 #: Maximum variable values allowed
 #:
 SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLE_VALUES = 10
+
+#: Whether combination jobs are processed in a background thread
+#: of the current process. When disabled, jobs are processed
+#: right away while handling the request.
+#:
+SHUUP_PRODUCT_VARIATIONS_RUN_JOBS_IN_BACKGROUND = True
+
+#: Number of threads processing combination jobs
+#:
+SHUUP_PRODUCT_VARIATIONS_JOB_WORKERS = 2
+
+#: Number of combinations saved per transaction while processing a job
+#:
+SHUUP_PRODUCT_VARIATIONS_JOB_CHUNK_SIZE = 100
+
+#: Seconds after which a combination job that is still processing without
+#: saving any progress is considered abandoned, e.g. after a restart, and
+#: queued again by the `process_combinations_jobs` command
+#:
+SHUUP_PRODUCT_VARIATIONS_JOB_STALE_SECONDS = 60 * 30
+
+#: Maximum number of combinations returned per page
+#: when the combinations are requested with a cursor or limit
+#:
+SHUUP_PRODUCT_VARIATIONS_MAX_PAGE_SIZE = 500
+
+#: Number of combination matrices kept in the in-process cache
+#:
+SHUUP_PRODUCT_VARIATIONS_COMBINATIONS_LRU_SIZE = 128
+
+#: Seconds the combination matrices are kept in the Django cache
+#:
+SHUUP_PRODUCT_VARIATIONS_COMBINATIONS_CACHE_TIMEOUT = 60 * 60 * 24
+
+#: Whether to record the query count, DB time and total time of
+#: the variation admin views and serializer saves. The recent samples
+#: are available for staff at the variations stats URL.
+#:
+SHUUP_PRODUCT_VARIATIONS_INSTRUMENTATION_ENABLED = False
+
+#: Number of recent samples kept in memory when the instrumentation is enabled
+#:
+SHUUP_PRODUCT_VARIATIONS_INSTRUMENTATION_SAMPLES = 500
+
+#: Seconds the compressed snapshot of the variations library is kept in the Django cache
+#:
+SHUUP_PRODUCT_VARIATIONS_LIBRARY_CACHE_TIMEOUT = 60 * 60 * 24
+
+#: Number of currencies kept in the in-process cache of the product variations section
+#:
+SHUUP_PRODUCT_VARIATIONS_CURRENCIES_LRU_SIZE = 32
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from shuup.core.models import (
+    Currency, Product, ProductMode, ProductVariationResult,
+    ProductVariationVariable, ProductVariationVariableValue, ShopProduct
+)
+from shuup.utils.djangoenv import has_installed
+from shuup_product_variations.cache import (
+    bump_combinations_version, bump_currencies_version, bump_library_version,
+    bump_product_version
+)
+from shuup_product_variations.combinations import (
+    invalidate_variation_combinations
+)
+from shuup_product_variations.models import (
+    VariationCombination, VariationVariable, VariationVariableValue
+)
+
+
+VARIATION_PARENT_MODES = (ProductMode.SIMPLE_VARIATION_PARENT, ProductMode.VARIABLE_VARIATION_PARENT)
+
+
+def _bump_parent_of_product(product_id):
+    parent_id = Product.objects.filter(pk=product_id).values_list("variation_parent_id", flat=True).first()
+    bump_product_version(parent_id or product_id)
+
+
+@receiver(post_save, sender=Product, dispatch_uid="shuup_product_variations:product_saved")
+def handle_product_saved(sender, instance, **kwargs):
+    # products outside of any variation have no combinations,
+    # unlinking a child deletes its result which is handled below
+    if not instance.variation_parent_id and instance.mode not in VARIATION_PARENT_MODES:
+        return
+
+    # the mode of the parent and the state of the children affect the available combinations
+    bump_combinations_version(instance.variation_parent_id or instance.pk)
+
+    if instance.variation_parent_id:
+        combinations = VariationCombination.objects.filter(product_id=instance.pk)
+        if instance.deleted:
+            combinations.delete()
+        else:
+            combinations.exclude(sku=instance.sku).update(sku=instance.sku)
+
+
+@receiver(post_save, sender=ShopProduct, dispatch_uid="shuup_product_variations:shop_product_saved")
+def handle_shop_product_saved(sender, instance, **kwargs):
+    product_info = Product.objects.filter(pk=instance.product_id).values_list("variation_parent_id", "mode").first()
+    if not product_info:
+        return
+
+    (variation_parent_id, mode) = product_info
+    if not variation_parent_id and mode not in VARIATION_PARENT_MODES:
+        return
+
+    bump_product_version(variation_parent_id or instance.product_id)
+
+    # with multivendor the prices come from the supplier prices
+    if variation_parent_id and not has_installed("shuup_multivendor"):
+        VariationCombination.objects.filter(shop_product_id=instance.pk).update(price=instance.default_price_value)
+
+
+@receiver(post_save, sender=ProductVariationVariable, dispatch_uid="shuup_product_variations:variable_saved")
+@receiver(post_delete, sender=ProductVariationVariable, dispatch_uid="shuup_product_variations:variable_deleted")
+@receiver(post_save, sender=ProductVariationResult, dispatch_uid="shuup_product_variations:result_saved")
+@receiver(post_delete, sender=ProductVariationResult, dispatch_uid="shuup_product_variations:result_deleted")
+def handle_product_variation_changed(sender, instance, **kwargs):
+    invalidate_variation_combinations(instance.product_id)
+
+
+@receiver(post_save, sender=ProductVariationVariableValue, dispatch_uid="shuup_product_variations:value_saved")
+@receiver(post_delete, sender=ProductVariationVariableValue, dispatch_uid="shuup_product_variations:value_deleted")
+def handle_product_variation_value_changed(sender, instance, **kwargs):
+    product_id = ProductVariationVariable.objects.filter(
+        pk=instance.variable_id
+    ).values_list("product_id", flat=True).first()
+    # when the variable is gone, deleting it invalidated the combinations already
+    if product_id:
+        invalidate_variation_combinations(product_id)
+
+
+@receiver(post_save, sender=VariationVariable, dispatch_uid="shuup_product_variations:library_variable_saved")
+@receiver(post_delete, sender=VariationVariable, dispatch_uid="shuup_product_variations:library_variable_deleted")
+@receiver(post_save, sender=VariationVariableValue, dispatch_uid="shuup_product_variations:library_value_saved")
+@receiver(post_delete, sender=VariationVariableValue, dispatch_uid="shuup_product_variations:library_value_deleted")
+def handle_library_changed(sender, instance, **kwargs):
+    bump_library_version()
+
+
+@receiver(post_save, sender=Currency, dispatch_uid="shuup_product_variations:currency_saved")
+@receiver(post_delete, sender=Currency, dispatch_uid="shuup_product_variations:currency_deleted")
+def handle_currency_changed(sender, instance, **kwargs):
+    bump_currencies_version()
+
+
+if has_installed("shuup.simple_supplier"):
+    from shuup.simple_supplier.models import StockCount
+
+    @receiver(post_save, sender=StockCount, dispatch_uid="shuup_product_variations:stock_count_saved")
+    def handle_stock_count_saved(sender, instance, **kwargs):
+        combinations = VariationCombination.objects.filter(
+            product_id=instance.product_id,
+            supplier_id=instance.supplier_id,
+            stock_count__isnull=False
+        )
+        # only the combination rows show the stocks, missing rows are built with the current stocks
+        parent_id = combinations.values_list("parent_id", flat=True).first()
+        if not parent_id:
+            return
+
+        bump_product_version(parent_id)
+        combinations.update(stock_count=instance.logical_count)
+
+
+if has_installed("shuup_multivendor"):
+    from shuup_multivendor.models import SupplierPrice
+
+    @receiver(post_save, sender=SupplierPrice, dispatch_uid="shuup_product_variations:supplier_price_saved")
+    def handle_supplier_price_saved(sender, instance, **kwargs):
+        _bump_parent_of_product(instance.product_id)
+        VariationCombination.objects.filter(
+            product_id=instance.product_id,
+            shop_id=instance.shop_id,
+            supplier_id=instance.supplier_id
+        ).update(price=instance.amount_value)
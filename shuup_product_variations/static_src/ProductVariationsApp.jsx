@@ -50,51 +50,49 @@ const createCombinations = (combinations) => Client.request({
   data: combinations,
 });
 
-const CombinationsCreator = {
-  createNextCombination(onFinish) {
-    const that = this;
-    if (this.combinationQueue.length === 0) {
-      onFinish();
-    } else {
-      const combinations = this.combinationQueue.splice(0, 5);
-      that.currentIndex += combinations.length;
-      that.onUpdateProgress((that.currentIndex / this.totalToProcess) * 100.0);
-
-      createCombinations(combinations).then(() => {
-        that.createNextCombination(onFinish);
-      }).catch((error) => {
-        that.errors.push(error);
-        that.createNextCombination(onFinish);
-      });
-    }
+const createCombinationsJob = (combinations) => Client.request({
+  url: window.SHUUP_PRODUCT_VARIATIONS_DATA.combinations_jobs_url,
+  method: 'POST',
+  data: combinations,
+});
+
+const getCombinationsJob = (jobId) => Client.get(
+  window.SHUUP_PRODUCT_VARIATIONS_DATA.combinations_job_url.replace('xxxx', jobId),
+);
+
+const CombinationsJobPoller = {
+  pollInterval: 1000,
+
+  poll(jobId, onUpdateProgress, resolve, reject) {
+    getCombinationsJob(jobId).then((response) => {
+      const job = response.data;
+      onUpdateProgress(job.progress);
+      if (job.status === 'pending' || job.status === 'processing') {
+        setTimeout(() => this.poll(jobId, onUpdateProgress, resolve, reject), this.pollInterval);
+      } else if (job.status === 'failed' || job.errors.length > 0) {
+        reject(new CombinationOperationError(gettext('Failed to create combinations'), job.errors));
+      } else {
+        resolve();
+      }
+    }).catch((error) => {
+      reject(new CombinationOperationError(gettext('Failed to create combinations'), [error]));
+    });
   },
 
   create(combinations, onUpdateProgress) {
-    this.totalToProcess = combinations.length;
-    this.errors = [];
-    this.currentIndex = 0;
-    this.onUpdateProgress = onUpdateProgress;
-    this.combinationQueue = [...combinations];
-
-    return new Promise((resolve, reject) => {
-      this.createNextCombination(() => {
-        const that = this;
-        if (that.errors.length > 0) {
-          reject(new CombinationOperationError(gettext('Failed to create combinations'), this.errors));
-        } else {
-          resolve();
-        }
-      });
-    });
+    // the server keeps processing the job even if the page is closed
+    return createCombinationsJob(combinations).then((response) => new Promise((resolve, reject) => {
+      this.poll(response.data.id, onUpdateProgress, resolve, reject);
+    }));
   },
 };
 
 const createAllCombinations = async (combinations, onUpdateProgress) => {
-  // when we have more than 20 combinations, let's create them one by one
+  // when we have more than 20 combinations, let the server create them in the background
   onUpdateProgress(0); // 0%
 
   if (combinations.length > 20) {
-    await CombinationsCreator.create(combinations, onUpdateProgress);
+    await CombinationsJobPoller.create(combinations, onUpdateProgress);
   } else {
     try {
       await createCombinations(combinations);
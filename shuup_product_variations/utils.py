@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils.text import slugify
+from parler.cache import get_translation_cache_key
+
+
+def get_unused_identifier(name: str, used_identifiers: Set[Tuple], scope=None) -> Optional[str]:
+    """
+    Return the slug of `name` as an identifier within `scope`
+
+    `None` is returned when the slug is empty or already in
+    `used_identifiers`, which is updated with the returned identifier.
+    The identifiers of the variables and values are unique per product
+    or variable but they are allowed to be empty.
+    """
+    identifier = slugify(name)
+    if not identifier or (scope, identifier) in used_identifiers:
+        return None
+    used_identifiers.add((scope, identifier))
+    return identifier
+
+
+def bulk_create_translated(model, objects: List, lookup_fields: Sequence[str]) -> List:
+    """
+    Insert translatable `objects` along with their current translation
+
+    Databases that return the primary keys from bulk inserts give them
+    to the objects right away. Elsewhere the saved rows are matched back
+    through `lookup_fields`, and the objects are saved one by one when
+    some of them have an empty or repeated lookup value since the rows
+    could not be told apart. Returns the saved instances in the same order.
+    """
+    if not objects:
+        return []
+
+    def get_key(obj):
+        return tuple(getattr(obj, field) for field in lookup_fields)
+
+    features = connection.features
+    can_return_pks = bool(
+        getattr(features, "can_return_rows_from_bulk_insert", False) or
+        getattr(features, "can_return_ids_from_bulk_insert", False)
+    )
+    keys = [get_key(obj) for obj in objects]
+    if not can_return_pks and (
+        len(set(keys)) != len(keys) or
+        any(value in (None, "") for key in keys for value in key)
+    ):
+        for obj in objects:
+            obj.save()
+        return list(objects)
+
+    translation_model = model._parler_meta.root_model
+    translated_fields = model._parler_meta.get_translated_fields()
+    translations = [
+        (obj.get_current_language(), {field: getattr(obj, field) for field in translated_fields})
+        for obj in objects
+    ]
+
+    model.objects.bulk_create(objects)
+
+    if can_return_pks:
+        saved = list(objects)
+    else:
+        saved_objects = {}
+        lookup = {
+            "%s__in" % field: set(getattr(obj, field) for obj in objects)
+            for field in lookup_fields
+        }
+        # when the lookup is ambiguous, the newest row is the one just inserted
+        for saved_object in model.objects.filter(**lookup).order_by("pk"):
+            saved_objects[get_key(saved_object)] = saved_object
+        saved = [saved_objects[key] for key in keys]
+
+    translation_model.objects.bulk_create([
+        translation_model(master_id=saved_object.pk, language_code=language_code, **values)
+        for saved_object, (language_code, values) in zip(saved, translations)
+    ])
+    return saved
+
+
+def bulk_update_translations(model, translations: Dict[int, Dict[str, Dict[str, str]]]) -> int:
+    """
+    Write the given `{pk: {language_code: {field: value}}}` translations of `model`
+
+    The existing translation rows are updated and the missing ones are
+    inserted in bulk, skipping the rows that would not change. Bulk
+    writes do not go through parler, so the cached translations of the
+    written rows are cleared here. Returns the amount of rows written.
+    """
+    if not translations:
+        return 0
+
+    translation_model = model._parler_meta.root_model
+    existing_translations = {
+        (translation.master_id, translation.language_code): translation
+        for translation in translation_model.objects.filter(
+            master_id__in=translations.keys(),
+            language_code__in=set(
+                language_code
+                for item_translations in translations.values()
+                for language_code in item_translations.keys()
+            )
+        )
+    }
+
+    new_translations = []
+    changed_translations = []
+    changed_fields = set()
+    for master_id, item_translations in translations.items():
+        for language_code, values in item_translations.items():
+            translation = existing_translations.get((master_id, language_code))
+            if translation is None:
+                new_translations.append(
+                    translation_model(master_id=master_id, language_code=language_code, **values)
+                )
+                continue
+
+            changed_values = {
+                field: value for field, value in values.items()
+                if getattr(translation, field) != value
+            }
+            if changed_values:
+                for field, value in changed_values.items():
+                    setattr(translation, field, value)
+                changed_fields.update(changed_values.keys())
+                changed_translations.append(translation)
+
+    if new_translations:
+        translation_model.objects.bulk_create(new_translations)
+    if changed_translations:
+        translation_model.objects.bulk_update(changed_translations, sorted(changed_fields))
+
+    written_translations = new_translations + changed_translations
+    cache.delete_many([
+        get_translation_cache_key(translation_model, translation.master_id, translation.language_code)
+        for translation in written_translations
+    ])
+    return len(written_translations)
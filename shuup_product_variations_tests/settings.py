@@ -24,3 +24,12 @@ MIGRATION_MODULES.update({
     app: None
     for app in INSTALLED_APPS
 })
+
+SHUUP_PRODUCT_VARIATIONS_RUN_JOBS_IN_BACKGROUND = False
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shuup_product_variations_tests',
+    }
+}
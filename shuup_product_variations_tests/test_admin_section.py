@@ -7,10 +7,14 @@
 # LICENSE file in the root directory of this source tree.
 import pytest
 
+from django.urls import clear_script_prefix, reverse, set_script_prefix
+from shuup.core.models import Currency
 from shuup.testing import factories
 from shuup.testing.utils import apply_request_middleware
 
-from shuup_product_variations.sections import ProductVariationsSection
+from shuup_product_variations.sections import (
+    get_url_template, ProductVariationsSection
+)
 
 
 @pytest.mark.django_db
@@ -24,6 +28,9 @@ def test_product_admin_section_visibility(rf, admin_user):
     assert ProductVariationsSection.visible_for_object(product, request)
 
     shop_product.suppliers.clear()
+    # the lookups are memoized for the request
+    assert ProductVariationsSection.visible_for_object(product, request)
+    request = apply_request_middleware(rf.get("/"), user=admin_user, shop=shop)
     assert not ProductVariationsSection.visible_for_object(product, request)
 
     product.pk = None
@@ -43,4 +50,54 @@ def test_product_admin_section_context(rf, admin_user):
     shop_product = product.get_shop_instance(shop)
 
     request = apply_request_middleware(rf.get("/"), user=admin_user, shop=shop)
-    assert ProductVariationsSection.get_context_data(product, request)
+    assert ProductVariationsSection.visible_for_object(product, request)
+    context = ProductVariationsSection.get_context_data(product, request)
+    assert context["product_url"] == reverse("shuup_admin:shop_product.edit", kwargs=dict(pk=shop_product.pk))
+    assert context["product_url_template"] == reverse(
+        "shuup_admin:shop_product.edit", kwargs=dict(pk=9999)
+    ).replace("9999", "xxxx")
+    assert context["combinations_url"] == reverse(
+        "shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=product.pk)
+    )
+    assert context["combinations_jobs_url"] == reverse(
+        "shuup_admin:shuup_product_variations.product.combinations_jobs", kwargs=dict(pk=product.pk)
+    )
+    assert context["default_variations_url"] == reverse("shuup_admin:shuup_product_variations.variations.list")
+    assert context["can_create"]
+    assert context["can_edit"]
+    assert context["currency"] == shop.currency
+
+    # the URL templates follow the script prefix of the request
+    set_script_prefix("/prefix/")
+    try:
+        context = ProductVariationsSection.get_context_data(product, request)
+        assert context["product_url_template"].startswith("/prefix/")
+        assert context["default_variations_url"].startswith("/prefix/")
+    finally:
+        clear_script_prefix()
+    assert get_url_template("shuup_admin:shop_product.edit") == reverse(
+        "shuup_admin:shop_product.edit", kwargs=dict(pk=9999)
+    ).replace("9999", "xxxx")
+
+
+@pytest.mark.django_db
+def test_product_admin_section_currency(rf, admin_user, django_assert_num_queries):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    currency = Currency.objects.get(code=shop.currency)
+
+    request = apply_request_middleware(rf.get("/"), user=admin_user, shop=shop)
+    context = ProductVariationsSection.get_context_data(product, request)
+    assert context["currency_decimal_places"] == currency.decimal_places
+
+    # the shop product and the currency are not read again
+    with django_assert_num_queries(0):
+        ProductVariationsSection.visible_for_object(product, request)
+        ProductVariationsSection.get_context_data(product, request)
+
+    currency.decimal_places = 3
+    currency.save()
+    request = apply_request_middleware(rf.get("/"), user=admin_user, shop=shop)
+    context = ProductVariationsSection.get_context_data(product, request)
+    assert context["currency_decimal_places"] == 3
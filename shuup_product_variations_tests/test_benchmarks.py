@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+"""
+Benchmarks for the combination endpoints
+
+The benchmarks are skipped unless an output file is given:
+
+    SHUUP_PRODUCT_VARIATIONS_BENCHMARK=results.json py.test shuup_product_variations_tests/test_benchmarks.py
+
+The matrix sizes can be configured as comma separated `<variables>x<values>`:
+
+    SHUUP_PRODUCT_VARIATIONS_BENCHMARK_SIZES=1x10,3x10,4x10
+"""
+import itertools
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import django
+import pytest
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from shuup.core.models import (
+    ProductVariationVariable, ProductVariationVariableValue
+)
+from shuup.testing import factories
+
+BENCHMARK_OUTPUT = os.environ.get("SHUUP_PRODUCT_VARIATIONS_BENCHMARK")
+BENCHMARK_SIZES = [
+    tuple(int(part) for part in size.split("x"))
+    for size in os.environ.get("SHUUP_PRODUCT_VARIATIONS_BENCHMARK_SIZES", "1x10,2x10,3x10,4x5").split(",")
+]
+RESULTS = {}
+
+pytestmark = pytest.mark.skipif(
+    not BENCHMARK_OUTPUT,
+    reason="Set SHUUP_PRODUCT_VARIATIONS_BENCHMARK to the output file to run the benchmarks"
+)
+
+
+def _write_results():
+    with open(BENCHMARK_OUTPUT, "w") as output:
+        json.dump({
+            "created_on": now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "results": RESULTS
+        }, output, indent=2, sort_keys=True)
+
+
+def _measure(results, name, func):
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = func()
+        wall_time = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert response.status_code in (200, 304), response.content
+    results[name] = {
+        "wall_time": wall_time,
+        "queries": len(queries),
+        "db_time": sum(float(query["time"]) for query in queries.captured_queries),
+        "peak_memory": peak_memory,
+        "response_size": len(response.content),
+    }
+    return response
+
+
+def _get_payload(variables, values, sku_prefix):
+    options = [
+        [("Variable %d" % variable, "Value %d" % value) for value in range(values)]
+        for variable in range(variables)
+    ]
+    return [
+        {
+            "combination": dict(combination),
+            "sku": "%s-%d" % (sku_prefix, index),
+            "price": "%d" % (index % 50 + 1),
+            "stock_count": index % 20 + 1,
+        }
+        for index, combination in enumerate(itertools.product(*options))
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("variables,values", BENCHMARK_SIZES)
+def test_combination_endpoints_benchmark(admin_user, variables, values):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    combinations_url = reverse(
+        "shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk)
+    )
+    variations_url = reverse("shuup_admin:shuup_product_variations.product.variations", kwargs=dict(pk=product.pk))
+    library_url = reverse("shuup_admin:shuup_product_variations.variations.list")
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = _get_payload(variables, values, "bench")
+    results = {"combinations": len(payload)}
+
+    _measure(results, "combinations_post_create", lambda: client.post(
+        combinations_url, data=payload, content_type="application/json"))
+    _measure(results, "combinations_post_resave", lambda: client.post(
+        combinations_url, data=payload, content_type="application/json"))
+    response = _measure(results, "combinations_get", lambda: client.get(combinations_url))
+    _measure(results, "combinations_get_not_modified", lambda: client.get(
+        combinations_url, HTTP_IF_NONE_MATCH=response.get("ETag", "")))
+    _measure(results, "product_variations_get", lambda: client.get(variations_url))
+
+    # the payloads are read before measuring the writes
+    variable_ids = list(
+        ProductVariationVariable.objects.filter(product=product).order_by("pk").values_list("pk", flat=True)
+    )
+    value_ids = list(
+        ProductVariationVariableValue.objects.filter(
+            variable__product=product
+        ).order_by("pk").values_list("variable_id", "pk")
+    )
+    translations_data = {
+        "variables": {variable_id: {"fi": "Muuttuja %d" % variable_id} for variable_id in variable_ids},
+        "values": {value_id: {"fi": "Arvo %d" % value_id} for (variable_id, value_id) in value_ids}
+    }
+    reorder_data = {
+        "values": [value_id for (variable_id, value_id) in reversed(value_ids) if variable_id == variable_ids[0]]
+    }
+    _measure(results, "product_variations_translations_post", lambda: client.post(
+        reverse("shuup_admin:shuup_product_variations.product.variations_translations", kwargs=dict(pk=product.pk)),
+        data=translations_data,
+        content_type="application/json"
+    ))
+    _measure(results, "product_variations_reorder_post", lambda: client.post(
+        reverse("shuup_admin:shuup_product_variations.product.variations_reorder", kwargs=dict(pk=product.pk)),
+        data=reorder_data,
+        content_type="application/json"
+    ))
+
+    def post_library_variables():
+        for variable in range(variables):
+            response = client.post(library_url, data={
+                "name": "Variable %d" % variable,
+                "values": ["Value %d" % value for value in range(values)]
+            }, content_type="application/json")
+            assert response.status_code == 200, response.content
+        return response
+
+    _measure(results, "variations_list_post", post_library_variables)
+    _measure(results, "variations_list_get", lambda: client.get(library_url))
+
+    _measure(results, "combinations_delete", lambda: client.delete(
+        combinations_url,
+        data=[{"combination": combination["combination"]} for combination in payload],
+        content_type="application/json"
+    ))
+
+    RESULTS["%dx%d" % (variables, values)] = results
+    _write_results()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import pytest
+
+from django.urls import reverse
+from django.test import Client
+from shuup.testing import factories
+from shuup.core.models import ProductVariationVariableValue
+
+from shuup_product_variations.cache import (
+    get_available_combinations, get_combinations_version, get_product_version
+)
+
+
+@pytest.mark.django_db
+def test_available_combinations_cache(admin_user, django_assert_num_queries):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Color": "Red", "Size": "L"}, "sku": "red-l"},
+        {"combination": {"Color": "Blue", "Size": "L"}, "sku": "blue-l"},
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    product.refresh_from_db()
+    combinations = get_available_combinations(product)
+    assert len(combinations) == 2
+    assert set(combination["variable_to_value"]["Color"] for combination in combinations) == {"Red", "Blue"}
+    assert all(combination["result_product_pk"] for combination in combinations)
+
+    with django_assert_num_queries(0):
+        assert get_available_combinations(product) == combinations
+
+    # writes to the variation values invalidate the cache
+    ProductVariationVariableValue.objects.create(variable=product.variation_variables.first(), value="Extra")
+    assert len(get_available_combinations(product)) != len(combinations)
+
+
+@pytest.mark.django_db
+def test_signal_handlers_skip_products_outside_variations():
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop, stock_managed=True)
+    product = factories.create_product("normal-sku", shop=shop, supplier=supplier)
+
+    combinations_version = get_combinations_version(product.pk)
+    product_version = get_product_version(product.pk)
+    product.name = "Renamed"
+    product.save()
+    supplier.adjust_stock(product.pk, 5)
+    shop_product = product.get_shop_instance(shop)
+    shop_product.default_price_value = 10
+    shop_product.save()
+    assert get_combinations_version(product.pk) == combinations_version
+    assert get_product_version(product.pk) == product_version
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import pytest
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils.timezone import now
+from shuup.testing import factories
+from shuup.core.models import ShopProduct
+
+from shuup_product_variations.jobs import process_combinations_job
+from shuup_product_variations.models import CombinationsJob, CombinationsJobStatus
+
+
+def _get_payload(count):
+    return [
+        {
+            "combination": {"Size": "%d" % index},
+            "sku": "size-%d" % index,
+            "price": "%d" % (index + 1),
+            "stock_count": index + 1,
+        }
+        for index in range(count)
+    ]
+
+
+@pytest.mark.django_db
+@override_settings(SHUUP_PRODUCT_VARIATIONS_JOB_CHUNK_SIZE=10)
+def test_combinations_job(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    jobs_url = reverse(
+        "shuup_admin:shuup_product_variations.product.combinations_jobs",
+        kwargs=dict(pk=shop_product.pk)
+    )
+
+    client = Client()
+    client.force_login(admin_user)
+
+    response = client.post(jobs_url, data=_get_payload(25), content_type="application/json")
+    assert response.status_code == 202
+    data = response.json()
+    assert data["status"] == "completed"
+    assert data["processed"] == data["total"] == 25
+    assert data["progress"] == 100
+    assert not data["errors"]
+    assert len(data["combinations"]) == 25
+    assert product.variation_children.count() == 25
+
+    child = ShopProduct.objects.get(product_id=data["combinations"][4]["product_id"])
+    assert child.product.sku == "size-4"
+    assert child.default_price_value == Decimal("5")
+    assert supplier.get_stock_status(child.product_id).logical_count == 5
+
+    job_url = reverse("shuup_admin:shuup_product_variations.combinations_job", kwargs=dict(pk=data["id"]))
+    response = client.get(job_url)
+    assert response.status_code == 200
+    assert response.json() == data
+
+    # malformed payloads and SKU conflicts are rejected before creating the job
+    response = client.post(jobs_url, data=[{"combination": {"Size": "1"}}], content_type="application/json")
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+    payload = _get_payload(15)
+    payload[12]["sku"] = product.sku
+    response = client.post(jobs_url, data=payload, content_type="application/json")
+    assert response.status_code == 400
+    assert response.json()["error"]["combinations"][12]["sku"]
+    assert CombinationsJob.objects.count() == 1
+
+    # a chunk failing doesn't abort the others, like when a SKU got taken after the job was created,
+    # but the job fails and the results tell which combinations were saved
+    job = CombinationsJob.objects.create(
+        shop=shop, supplier=supplier, product=product, combinations=payload, total=len(payload)
+    )
+    process_combinations_job(job.pk)
+    job.refresh_from_db()
+    assert job.status == CombinationsJobStatus.FAILED
+    assert job.processed == 15
+    assert len(job.results) == 10
+    assert job.errors[0]["code"] == "validation-fail"
+    assert (job.errors[0]["start"], job.errors[0]["end"]) == (10, 15)
+
+
+@pytest.mark.django_db
+def test_process_pending_combinations_jobs(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+
+    job = CombinationsJob.objects.create(
+        shop=shop, supplier=supplier, product=product, combinations=_get_payload(3), total=3
+    )
+    call_command("process_combinations_jobs")
+    job.refresh_from_db()
+    assert job.status == CombinationsJobStatus.COMPLETED
+    assert job.processed == 3
+    assert product.variation_children.count() == 3
+
+    # jobs are never processed twice
+    assert not process_combinations_job(job.pk)
+
+
+@pytest.mark.django_db
+@override_settings(SHUUP_PRODUCT_VARIATIONS_JOB_CHUNK_SIZE=2)
+def test_resume_stale_combinations_jobs(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+
+    # a worker went away after saving the first chunk
+    job = CombinationsJob.objects.create(
+        shop=shop, supplier=supplier, product=product, combinations=_get_payload(5), total=5,
+        status=CombinationsJobStatus.PROCESSING, processed=2, results=[]
+    )
+    call_command("process_combinations_jobs")
+    job.refresh_from_db()
+    assert job.status == CombinationsJobStatus.PROCESSING
+
+    CombinationsJob.objects.filter(pk=job.pk).update(modified_on=now() - timedelta(days=1))
+    call_command("process_combinations_jobs")
+    job.refresh_from_db()
+    assert job.status == CombinationsJobStatus.COMPLETED
+    assert job.processed == 5
+    assert [combination["sku"] for combination in job.results] == ["size-2", "size-3", "size-4"]
+    assert set(product.variation_children.values_list("sku", flat=True)) == {"size-2", "size-3", "size-4"}
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# This file is part of Shuup.
+#
+# Copyright (c) 2012-2020, Shoop Commerce Ltd. All rights reserved.
+#
+# This source code is licensed under the OSL-3.0 license found in the
+# LICENSE file in the root directory of this source tree.
+import pytest
+
+from django.contrib.auth.models import Group
+from django.test import Client, override_settings
+from django.urls import reverse
+from shuup.admin.utils.permissions import set_permissions_for_group
+from shuup.testing import factories
+
+from shuup_product_variations.instrumentation import clear_samples
+
+
+@pytest.mark.django_db
+def test_instrumentation_samples(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    combinations_url = reverse(
+        "shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk)
+    )
+    stats_url = reverse("shuup_admin:shuup_product_variations.stats")
+    payload = [
+        {"combination": {"Color": "Red"}, "sku": "red", "price": "5", "stock_count": 1},
+        {"combination": {"Color": "Blue"}, "sku": "blue", "price": "6", "stock_count": 2},
+    ]
+
+    client = Client()
+    client.force_login(admin_user)
+    clear_samples()
+
+    # nothing is recorded by default
+    response = client.post(combinations_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    data = client.get(stats_url).json()
+    assert data["enabled"] is False
+    assert data["samples"] == []
+
+    with override_settings(SHUUP_PRODUCT_VARIATIONS_INSTRUMENTATION_ENABLED=True):
+        response = client.post(combinations_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        data = client.get(stats_url).json()
+
+    assert data["enabled"] is True
+    samples = {(sample["kind"], sample["name"]): sample for sample in data["samples"]}
+    view_sample = samples[("view", "ProductCombinationsView.post")]
+    assert view_sample["status"] == 200
+    assert view_sample["combinations"] == 2
+    assert view_sample["object_id"] == str(shop_product.pk)
+    assert view_sample["queries"] > 0
+    assert view_sample["request_size"] > 0
+
+    save_sample = samples[("serializer", "ProductCombinationsSerializer.save")]
+    assert save_sample["combinations"] == 2
+    assert save_sample["queries"] <= view_sample["queries"]
+    assert {item["name"] for item in data["summary"]} == {
+        "ProductCombinationsView.post", "ProductCombinationsSerializer.save"
+    }
+
+
+@pytest.mark.django_db
+def test_instrumentation_stats_requires_permission():
+    shop = factories.get_default_shop()
+    staff_user = factories.create_random_user(is_staff=True)
+    shop.staff_members.add(staff_user)
+    stats_url = reverse("shuup_admin:shuup_product_variations.stats")
+
+    client = Client()
+    client.force_login(staff_user)
+    response = client.get(stats_url)
+    assert response.status_code in (302, 403)
+
+    # staff with the admin permission of the view can see the stats
+    group = Group.objects.create(name="variation stats")
+    set_permissions_for_group(group, ["shuup_product_variations.stats"])
+    staff_user.groups.add(group)
+    response = client.get(stats_url)
+    assert response.status_code == 200
+    assert "summary" in response.json()
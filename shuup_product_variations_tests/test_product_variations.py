@@ -143,3 +143,131 @@ def test_create_product_variation(admin_user):
     )
     extralarge.refresh_from_db()
     assert extralarge.ordering == 3
+
+
+@pytest.mark.django_db
+def test_product_variations_bulk_translations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    other_product = factories.create_product("other-sku", shop=shop, supplier=supplier)
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Color": color}, "sku": "color-%s" % color.lower(), "price": "5"}
+        for color in ["Red", "Blue"]
+    ]
+    for parent in [product, other_product]:
+        response = client.post(
+            reverse(
+                "shuup_admin:shuup_product_variations.product.combinations",
+                kwargs=dict(pk=parent.get_shop_instance(shop).pk)
+            ),
+            data=[dict(item, sku="%s-%s" % (parent.sku, item["sku"])) for item in payload],
+            content_type="application/json",
+        )
+        assert response.status_code == 200
+
+    color = ProductVariationVariable.objects.get(product=product, identifier="color")
+    red = color.values.get(identifier="red")
+    translations_url = reverse(
+        "shuup_admin:shuup_product_variations.product.variations_translations",
+        kwargs={"pk": product.pk}
+    )
+    response = client.post(
+        translations_url,
+        data={"variables": {color.pk: {"fi": "Väri"}}, "values": {red.pk: {"fi": "Punainen", "en": "Crimson"}}},
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+    assert response.json()["written"] == 3
+
+    color = ProductVariationVariable.objects.get(pk=color.pk)
+    with switch_language(color, "fi"):
+        assert color.name == "Väri"
+    red = ProductVariationVariableValue.objects.get(pk=red.pk)
+    with switch_language(red, "fi"):
+        assert red.value == "Punainen"
+
+    # the combinations are read with the new names
+    combinations_url = reverse(
+        "shuup_admin:shuup_product_variations.product.combinations",
+        kwargs=dict(pk=shop_product.pk)
+    )
+    combinations = client.get(combinations_url).json()["combinations"]
+    assert sorted(combination["combination"]["Color"] for combination in combinations) == ["Blue", "Crimson"]
+
+    # the variables of other products can not be translated here
+    other_color = ProductVariationVariable.objects.get(product=other_product, identifier="color")
+    response = client.post(
+        translations_url,
+        data={"variables": {other_color.pk: {"fi": "Väri"}}},
+        content_type="application/json",
+    )
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+
+
+@pytest.mark.django_db
+def test_product_variations_bulk_reorder(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Color": color, "Size": size}, "sku": "%s-%s" % (color, size), "price": "5"}
+        for color in ["Red", "Blue", "Green"]
+        for size in ["S", "M"]
+    ]
+    response = client.post(
+        reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk)),
+        data=payload,
+        content_type="application/json",
+    )
+    assert response.status_code == 200
+
+    reorder_url = reverse("shuup_admin:shuup_product_variations.product.variations_reorder", kwargs={"pk": product.pk})
+    color = ProductVariationVariable.objects.get(product=product, identifier="color")
+    size = ProductVariationVariable.objects.get(product=product, identifier="size")
+    red, blue, green = [color.values.get(identifier=identifier) for identifier in ["red", "blue", "green"]]
+
+    # the red value is already first
+    response = client.post(reorder_url, data={"values": [red.pk, green.pk, blue.pk]}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["written"] == 2
+    assert [
+        value.ordering for value in ProductVariationVariableValue.objects.filter(pk__in=[red.pk, green.pk, blue.pk])
+        .order_by("pk")
+    ] == [0, 2, 1]
+
+    # the values have different orderings now
+    response = client.post(reorder_url, data={"values": [blue.pk, red.pk, green.pk]}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["written"] == 3
+    assert [
+        value.ordering for value in ProductVariationVariableValue.objects.filter(pk__in=[red.pk, green.pk, blue.pk])
+        .order_by("pk")
+    ] == [1, 0, 2]
+
+    response = client.post(reorder_url, data={"variables": [size.pk, color.pk]}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["written"] == 1
+    size.refresh_from_db()
+    color.refresh_from_db()
+    assert (size.ordering, color.ordering) == (0, 1)
+
+    response = client.post(reorder_url, data={"variables": [size.pk, color.pk]}, content_type="application/json")
+    assert response.json()["written"] == 0
+
+    # the values must belong to a single variable of the product
+    small = size.values.get(identifier="s")
+    response = client.post(reorder_url, data={"values": [red.pk, small.pk]}, content_type="application/json")
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+    response = client.post(reorder_url, data={"values": [red.pk, red.pk]}, content_type="application/json")
+    assert response.status_code == 400
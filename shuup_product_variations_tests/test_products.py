@@ -6,18 +6,26 @@
 # This source code is licensed under the OSL-3.0 license found in the
 # LICENSE file in the root directory of this source tree.
 import json
+import mock
 import pytest
 
 from decimal import Decimal
 
+from django.core.management import call_command
 from django.urls import reverse
-from django.test import Client
+from django.test import Client, override_settings
+from django.utils.text import slugify
 from shuup.testing import factories
 from shuup.core.models import (
-    ShopProduct, Product, ProductVariationVariable,
+    ShopProduct, Product, ProductMode, ProductVariationLinkStatus,
+    ProductVariationResult, ProductVariationVariable,
     ProductVariationVariableValue
 )
 
+from shuup_product_variations.cache import get_product_version
+from shuup_product_variations.combinations import refresh_variation_combinations
+from shuup_product_variations.models import VariationCombination
+
 
 @pytest.mark.django_db
 def test_create_product_variation(admin_user):
@@ -223,6 +231,47 @@ def test_delete_product_variation(admin_user):
     assert Product.objects.filter(deleted=True).count() == 2
 
 
+@pytest.mark.django_db
+def test_delete_all_product_variations(admin_user, django_assert_max_num_queries):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    create_payload = [
+        {"combination": {"Color": color, "Size": size}, "sku": "%s-%s" % (color, size)}
+        for color in ["Red", "Blue", "Green"]
+        for size in ["S", "M", "L", "XL"]
+    ]
+    response = client.post(view_url, data=create_payload, content_type="application/json")
+    assert response.status_code == 200
+    assert product.variation_children.filter(deleted=False).count() == 12
+
+    # removing a variable removes all the combinations, in a fixed amount of queries
+    delete_payload = [{"combination": combination["combination"]} for combination in create_payload]
+    with django_assert_max_num_queries(40):
+        response = client.delete(view_url, data=delete_payload, content_type="application/json")
+    assert response.status_code == 200
+    assert product.variation_children.filter(deleted=False).count() == 0
+    assert product.variation_children.filter(deleted=True).count() == 12
+    assert not ProductVariationResult.objects.filter(
+        product=product, status=ProductVariationLinkStatus.VISIBLE
+    ).exists()
+    assert not ProductVariationVariable.objects.filter(product=product).exists()
+    assert not ProductVariationVariableValue.objects.filter(variable__product=product).exists()
+
+    # deleting the same combinations again or unknown SKUs is a no-op
+    response = client.delete(
+        view_url, data=delete_payload[:2] + [{"sku": "Red-S"}, {"sku": "unknown"}], content_type="application/json"
+    )
+    assert response.status_code == 200
+    assert product.variation_children.filter(deleted=True).count() == 12
+
+
 @pytest.mark.django_db
 def test_error_handling(admin_user):
     shop = factories.get_default_shop()
@@ -251,8 +300,8 @@ def test_error_handling(admin_user):
     response = client.post(view_url, data=invalid_create_payload, content_type="application/json")
     assert response.status_code == 400
     result = response.json()
-    assert result["error"] == "The SKU 'parent-sku' is already being used."
-    assert result["code"] == "sku-exists"
+    assert result["error"]["combinations"][0]["sku"][0] == "The SKU 'parent-sku' is already being used."
+    assert result["code"] == "validation-fail"
 
     # successfully create
     invalid_create_payload = [{
@@ -270,8 +319,26 @@ def test_error_handling(admin_user):
     response = client.post(view_url, data=invalid_create_payload, content_type="application/json")
     assert response.status_code == 400
     result = response.json()
-    assert result["error"] == "The SKU 'parent-sku' is already being used."
-    assert result["code"] == "sku-exists"
+    assert result["error"]["combinations"][0]["sku"][0] == "The SKU 'parent-sku' is already being used."
+    assert result["code"] == "validation-fail"
+
+    # all the conflicts are reported at once, before anything is written
+    invalid_create_payload = [
+        {"combination": {"Color": "Blue", "Size": "L"}, "sku": "blue-l"},
+        {"combination": {"Color": "Red", "Size": "L"}, "sku": "random"},
+        {"combination": {"Color": "Green", "Size": "L"}, "sku": product.sku},
+        {"combination": {"Color": "Black", "Size": "L"}, "sku": "random"},
+        {"combination": {"Color": "White", "Size": "L"}, "sku": "blue-l"},
+    ]
+    response = client.post(view_url, data=invalid_create_payload, content_type="application/json")
+    assert response.status_code == 400
+    errors = response.json()["error"]["combinations"]
+    assert errors[0] == {}
+    assert errors[1] == {}
+    assert errors[2]["sku"][0] == "The SKU 'parent-sku' is already being used."
+    assert errors[3]["sku"][0] == "The SKU 'random' is given to more than one combination."
+    assert errors[4]["sku"][0] == "The SKU 'blue-l' is given to more than one combination."
+    assert not Product.objects.filter(sku="blue-l").exists()
 
 
 @pytest.mark.django_db
@@ -317,3 +384,805 @@ def test_delete_recover_product_variation(admin_user):
     assert product.variation_children.count() == 2
     assert Product.objects.filter(deleted=True).count() == 0
     assert Product.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_bulk_create_update_and_recover_product_variations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    create_payload = [
+        {"combination": {"Color": "Red", "Size": "L"}, "sku": "red-l", "price": "10"},
+        {"combination": {"Color": "Red", "Size": "XL"}, "sku": "red-xl", "price": "11"},
+    ]
+    response = client.post(view_url, data=create_payload, content_type="application/json")
+    assert response.status_code == 200
+
+    delete_payload = [{"sku": "red-xl"}]
+    response = client.delete(view_url, data=delete_payload, content_type="application/json")
+    assert response.status_code == 200
+    assert Product.objects.filter(deleted=True).count() == 1
+
+    # one batch that updates, recovers and creates at the same time
+    batch_payload = [
+        {"combination": {"Color": "Red", "Size": "L"}, "sku": "red-l-new", "price": "12"},
+        {"combination": {"Color": "Red", "Size": "XL"}, "sku": "red-xl", "price": "13"},
+        {"combination": {"Color": "Blue", "Size": "L"}, "sku": "blue-l", "price": "14"},
+        {"combination": {"Color": "Blue", "Size": "XL"}, "sku": "blue-xl", "price": "15"},
+    ]
+    response = client.post(view_url, data=batch_payload, content_type="application/json")
+    assert response.status_code == 200
+    assert product.variation_children.count() == 4
+    assert Product.objects.filter(deleted=True).count() == 0
+    assert Product.objects.count() == 5
+
+    product_ids = [combination["product_id"] for combination in response.json()["combinations"]]
+    for product_id, combination in zip(product_ids, batch_payload):
+        child = Product.objects.get(pk=product_id)
+        assert child.sku == combination["sku"]
+        assert child.variation_parent == product
+        assert child.name.startswith(product.name)
+        assert child.get_shop_instance(shop).default_price_value == Decimal(combination["price"])
+        assert child.get_shop_instance(shop).suppliers.filter(pk=supplier.pk).exists()
+
+    # duplicated SKUs inside the same payload are rejected before writing anything
+    duplicated_payload = [
+        {"combination": {"Color": "Green", "Size": "L"}, "sku": "green"},
+        {"combination": {"Color": "Green", "Size": "XL"}, "sku": "green"},
+    ]
+    response = client.post(view_url, data=duplicated_payload, content_type="application/json")
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+    assert response.json()["error"]["combinations"][1]["sku"]
+    assert not Product.objects.filter(sku="green").exists()
+
+
+@pytest.mark.django_db
+def test_combination_variables_are_resolved_once(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"Color": color, "Size": size}, "sku": "%s-%s" % (color, size)}
+        for color in ["Red", "Blue", "Green"]
+        for size in ["S", "M", "L"]
+    ]
+    response = client.post(view_url, data=payload[:4], content_type="application/json")
+    assert response.status_code == 200
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    assert ProductVariationVariable.objects.filter(product=product).count() == 2
+    assert ProductVariationVariableValue.objects.filter(variable__product=product).count() == 6
+    color = ProductVariationVariable.objects.get(product=product, identifier="color")
+    assert color.name == "Color"
+    assert set(color.values.values_list("translations__value", flat=True)) == {"Red", "Blue", "Green"}
+    assert product.variation_children.count() == 9
+
+
+@pytest.mark.django_db
+def test_combinations_with_empty_and_colliding_slugs(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    # "颜色" and the emojis slugify to nothing while "Size (EU)" and "Size EU"
+    # as well as "1/2" and "12" slugify to the same identifier
+    payload = [
+        {"combination": {"颜色": color, "Size (EU)": size, "Size EU": size}, "sku": "%s-%s" % (index, size)}
+        for (index, color) in enumerate(["红色", "🙂", "🙃"])
+        for size in ["1/2", "12"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert product.variation_children.count() == 6
+
+    variables = ProductVariationVariable.objects.filter(product=product)
+    assert set(variables.values_list("translations__name", flat=True)) == {"颜色", "Size (EU)", "Size EU"}
+    assert set(variables.values_list("identifier", flat=True)) == {None, "size-eu"}
+    for variable in variables:
+        values = set(variable.values.values_list("translations__value", flat=True))
+        assert values == ({"红色", "🙂", "🙃"} if variable.name == "颜色" else {"1/2", "12"})
+
+    combinations = {
+        combination["result_product_pk"]: {
+            variable.name: value.value for (variable, value) in combination["variable_to_value"].items()
+        }
+        for combination in product.get_all_available_combinations()
+        if combination["result_product_pk"]
+    }
+    for combination in payload:
+        assert combinations[Product.objects.get(sku=combination["sku"]).pk] == combination["combination"]
+
+    # resending the same combinations resolves the existing variables and values
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert ProductVariationVariable.objects.filter(product=product).count() == 3
+    assert ProductVariationVariableValue.objects.filter(variable__product=product).count() == 7
+    assert product.variation_children.count() == 6
+
+
+@pytest.mark.django_db
+def test_paginated_product_combinations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"Color": color, "Size": size}, "sku": "%s-%s" % (color, size), "price": "5"}
+        for color in ["Red", "Blue", "Green"]
+        for size in ["S", "M", "L"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    # the default response stays unpaginated
+    data = client.get(view_url).json()
+    assert len(data["combinations"]) == 9
+    assert "next_cursor" not in data
+    all_hashes = sorted(combination["hash"] for combination in data["combinations"])
+
+    seen_hashes = []
+    cursor = ""
+    while True:
+        data = client.get(view_url, data={"cursor": cursor, "limit": 4}).json()
+        assert len(data["combinations"]) <= 4
+        assert (
+            set(item["product_id"] for item in data["product_data"]) ==
+            set(combination["product"] for combination in data["combinations"])
+        )
+        seen_hashes.extend(combination["hash"] for combination in data["combinations"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen_hashes == all_hashes
+
+    response = client.get(view_url, data={"limit": "0"})
+    assert response.status_code == 400
+    assert response.json()["code"] == "invalid-limit"
+
+
+@pytest.mark.django_db
+def test_compact_product_combinations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop, stock_managed=True)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"Color": color, "Size": size}, "sku": "%s-%s" % (color, size), "price": "5"}
+        for color in ["Red", "Blue"]
+        for size in ["S", "M", "L"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    data = client.get(view_url).json()
+    compact_data = client.get(view_url, data={"format": "compact"}).json()
+    assert compact_data["format"] == "compact"
+    assert sorted(compact_data["variables"]) == ["Color", "Size"]
+    columns = compact_data["combinations"]
+    assert len(columns["hash"]) == 6
+
+    # the compact response has the same content as the default one
+    product_data = {item["product_id"]: item for item in data["product_data"]}
+    for index, combination in enumerate(data["combinations"]):
+        assert columns["hash"][index] == combination["hash"]
+        assert columns["product"][index] == combination["product"]
+        assert columns["sku_part"][index] == combination["sku_part"]
+        assert {
+            variable: compact_data["values"][variable_index][columns["value_indexes"][index][variable_index]]
+            for variable_index, variable in enumerate(compact_data["variables"])
+        } == combination["combination"]
+        item = product_data[combination["product"]]
+        assert columns["pk"][index] == item["pk"]
+        assert columns["sku"][index] == item["sku"]
+        assert columns["price"][index] == item["price"]
+        assert columns["stock_count"][index] == item["stock_count"]
+
+    data = client.get(view_url, data={"format": "compact", "limit": 4}).json()
+    assert len(data["combinations"]["hash"]) == 4
+    assert data["next_cursor"]
+
+    response = client.get(view_url, data={"format": "rows"})
+    assert response.status_code == 400
+    assert response.json()["code"] == "invalid-format"
+
+
+@pytest.mark.django_db
+def test_generate_product_combinations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop, stock_managed=True)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+    generate_url = reverse(
+        "shuup_admin:shuup_product_variations.product.combinations_generate", kwargs=dict(pk=shop_product.pk)
+    )
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = {
+        "variables": {"Color": ["Red", "Blue", "Green"], "Size": ["S", "M"]},
+        "price": "12.5",
+        "stock_count": 4
+    }
+    response = client.post(generate_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert len(response.json()["combinations"]) == 6
+
+    product.refresh_from_db()
+    assert product.mode == ProductMode.VARIABLE_VARIATION_PARENT
+    red_s = Product.objects.get(sku="parent-sku-red-s")
+    assert red_s.variation_parent == product
+    assert red_s.get_shop_instance(shop).default_price_value == Decimal("12.5")
+    assert supplier.get_stock_status(red_s.pk).logical_count == 4
+
+    # only the combinations of the new size are created
+    payload = {
+        "variables": {"Color": ["Red", "Blue", "Green"], "Size": ["S", "M", "L"]},
+        "sku_pattern": "{parent_sku}/{values}"
+    }
+    response = client.post(generate_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert sorted(item["sku"] for item in response.json()["combinations"]) == [
+        "parent-sku/blue-l", "parent-sku/green-l", "parent-sku/red-l"
+    ]
+    assert len(client.get(view_url).json()["combinations"]) == 9
+
+    response = client.post(generate_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["combinations"] == []
+
+    # the generated SKUs must be unique, also when the values have no latin characters
+    for payload in [
+        {"variables": {"Color": ["Black", "White"]}, "sku_pattern": "{parent_sku}"},
+        {"variables": {"Color": ["红色", "蓝色"]}},
+        {"variables": {"Color": ["🙂"]}, "sku_pattern": "{values}"},
+    ]:
+        response = client.post(generate_url, data=payload, content_type="application/json")
+        assert response.status_code == 400
+        assert response.json()["code"] == "validation-fail"
+        assert "sku_pattern" in response.json()["error"]
+
+    for sku_pattern in ["{parent_sku}-{color}", "{parent_sku.foo}", "{parent_sku[a]}", "{parent_sku[0]!z}"]:
+        payload = {"variables": {"Color": ["Black"]}, "sku_pattern": sku_pattern}
+        response = client.post(generate_url, data=payload, content_type="application/json")
+        assert response.status_code == 400
+        assert "sku_pattern" in response.json()["error"]
+    assert len(client.get(view_url).json()["combinations"]) == 9
+
+    # the limits count the variables and values the product has already
+    with override_settings(SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLES=2, SHUUP_PRODUCT_VARIATIONS_MAX_VARIABLE_VALUES=4):
+        for variables in [{"Material": ["Wood"]}, {"Color": ["Red", "Black", "Pink"]}]:
+            response = client.post(generate_url, data={"variables": variables}, content_type="application/json")
+            assert response.status_code == 400
+            assert "variables" in response.json()["error"]
+    assert len(client.get(view_url).json()["combinations"]) == 9
+
+
+@pytest.mark.django_db
+def test_sync_product_combinations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop, stock_managed=True)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"Color": color, "Size": size}, "sku": "%s-%s" % (color, size), "price": "5", "stock_count": 2}
+        for color in ["Red", "Blue"]
+        for size in ["S", "M"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    blue_s = Product.objects.get(sku="Blue-S")
+
+    payload = [item for item in payload if item["sku"] != "Blue-S"]
+    payload[1]["price"] = "7"
+    payload.append({"combination": {"Color": "Green", "Size": "S"}, "sku": "Green-S", "price": "6"})
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    changes = response.json()
+    assert [item["sku"] for item in changes["created"]] == ["Green-S"]
+    assert [item["sku"] for item in changes["updated"]] == ["Red-M"]
+    assert [item["product"] for item in changes["deleted"]] == [blue_s.pk]
+    assert changes["deleted"][0]["combination"] == {"Color": "Blue", "Size": "S"}
+
+    blue_s.refresh_from_db()
+    assert blue_s.deleted
+    red_m = Product.objects.get(sku="Red-M")
+    assert red_m.get_shop_instance(shop).default_price_value == Decimal("7")
+    assert len(client.get(view_url).json()["combinations"]) == 4
+
+    # nothing changes when the state is sent again
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json() == {"created": [], "updated": [], "deleted": []}
+
+    # a stock set to zero is a change
+    payload[0]["stock_count"] = 0
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert [item["sku"] for item in response.json()["updated"]] == ["Red-S"]
+    assert supplier.get_stock_status(Product.objects.get(sku="Red-S").pk).logical_count == 0
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.json() == {"created": [], "updated": [], "deleted": []}
+
+    response = client.put(view_url, data=payload + [payload[0]], content_type="application/json")
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+
+
+@pytest.mark.django_db
+def test_sync_product_combinations_without_supplier(admin_user):
+    shop = factories.get_default_shop()
+    product = factories.create_product("parent-sku", shop=shop)
+    shop_product = product.get_shop_instance(shop)
+    assert not shop_product.suppliers.exists()
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"Size": size}, "sku": "size-%s" % size, "price": "5"}
+        for size in ["S", "M"]
+    ]
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert len(response.json()["created"]) == 2
+
+    # the current combinations are compared to the shop products
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json() == {"created": [], "updated": [], "deleted": []}
+
+    # omitted prices are kept when the combination is saved for another reason
+    payload = [{"combination": {"Size": "S"}, "sku": "size-small"}, {"combination": {"Size": "M"}, "sku": "size-M"}]
+    response = client.put(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert [item["sku"] for item in response.json()["updated"]] == ["size-small"]
+    assert Product.objects.get(sku="size-small").get_shop_instance(shop).default_price_value == Decimal("5")
+    assert Product.objects.get(sku="size-M").get_shop_instance(shop).default_price_value == Decimal("5")
+
+
+@pytest.mark.django_db
+def test_product_combinations_conditional_get(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+    variations_url = reverse("shuup_admin:shuup_product_variations.product.variations", kwargs=dict(pk=product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [{"combination": {"Color": "Red", "Size": "L"}, "sku": "red-l", "price": "10"}]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    for url in [view_url, variations_url]:
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response["ETag"]
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    combinations_etag = client.get(view_url)["ETag"]
+    variations_etag = client.get(variations_url)["ETag"]
+    payload = [{"combination": {"Color": "Red", "Size": "L"}, "sku": "red-l", "price": "12"}]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    response = client.get(view_url, HTTP_IF_NONE_MATCH=combinations_etag)
+    assert response.status_code == 200
+    assert Decimal(response.json()["product_data"][0]["price"]) == Decimal("12")
+
+    # renaming a variable changes the variations
+    color = ProductVariationVariable.objects.get(product=product, identifier="color")
+    variable_url = reverse(
+        "shuup_admin:shuup_product_variations.product.variations_variable", kwargs={"pk": color.pk}
+    )
+    response = client.post(variable_url, data={"language_code": "en", "name": "Colour"}, content_type="application/json")
+    assert response.status_code == 200
+    response = client.get(variations_url, HTTP_IF_NONE_MATCH=variations_etag)
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_bulk_stock_adjustments(admin_user):
+    from shuup.core.suppliers.enums import StockAdjustmentType
+    from shuup.simple_supplier.models import StockAdjustment, StockCount
+    from shuup.simple_supplier.module import SimpleSupplierModule
+
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Size": size}, "sku": "size-%s" % size, "stock_count": 10}
+        for size in ["S", "M", "L"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert StockAdjustment.objects.count() == 3
+
+    payload[0]["stock_count"] = 4
+    with mock.patch("shuup.simple_supplier.module.SimpleSupplierModule.update_stock") as update_stock:
+        response = client.post(view_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        # the stock counts are written in bulk
+        assert not update_stock.called
+
+    # only the changed stock was adjusted
+    assert StockAdjustment.objects.count() == 4
+    product_ids = [combination["product_id"] for combination in response.json()["combinations"]]
+    assert supplier.get_stock_status(product_ids[0]).logical_count == 4
+    assert supplier.get_stock_status(product_ids[0]).physical_count == 4
+    assert supplier.get_stock_status(product_ids[1]).logical_count == 10
+    adjustment = StockAdjustment.objects.order_by("pk").last()
+    assert adjustment.product_id == product_ids[0]
+    assert adjustment.delta == -6
+    assert adjustment.type == StockAdjustmentType.INVENTORY
+    assert adjustment.purchase_price_value == 0
+    assert StockCount.objects.get(supplier=supplier, product_id=product_ids[0]).stock_value_value == 0
+
+    # the products with a stock alert limit go through the supplier module
+    StockCount.objects.filter(supplier=supplier, product_id=product_ids[2]).update(alert_limit=5)
+    payload[2]["stock_count"] = 3
+    with mock.patch.object(
+        SimpleSupplierModule, "update_stock", autospec=True, side_effect=SimpleSupplierModule.update_stock
+    ) as update_stock:
+        response = client.post(view_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        assert [call[0][1] for call in update_stock.call_args_list] == [product_ids[2]]
+    assert StockAdjustment.objects.count() == 5
+    assert supplier.get_stock_status(product_ids[2]).logical_count == 3
+
+    # a zero stock is a stock too
+    payload[0]["stock_count"] = 0
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert StockAdjustment.objects.count() == 6
+    assert supplier.get_stock_status(product_ids[0]).logical_count == 0
+
+    # the products whose stocks are not managed are not adjusted
+    StockCount.objects.filter(supplier=supplier, product_id=product_ids[1]).update(stock_managed=False)
+    payload[1]["stock_count"] = 20
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert StockAdjustment.objects.count() == 6
+    assert StockCount.objects.get(supplier=supplier, product_id=product_ids[1]).logical_count == 10
+
+
+@pytest.mark.django_db
+def test_resave_unchanged_combinations(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop, stock_managed=True)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Size": size}, "sku": "size-%s" % size, "price": "5", "stock_count": 10}
+        for size in ["S", "M", "L"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    # saving the same state again writes nothing
+    version = get_product_version(product.pk)
+    with mock.patch.object(ShopProduct.objects, "bulk_update") as bulk_update:
+        with mock.patch(
+            "shuup_product_variations.admin.views.serializers.refresh_variation_combinations"
+        ) as refresh_combinations:
+            response = client.post(view_url, data=payload, content_type="application/json")
+            assert response.status_code == 200
+            assert not bulk_update.called
+            assert not refresh_combinations.called
+    assert get_product_version(product.pk) == version
+
+    # only the changed price is written
+    payload[1]["price"] = "8"
+    with mock.patch.object(ShopProduct.objects, "bulk_update", wraps=ShopProduct.objects.bulk_update) as bulk_update:
+        response = client.post(view_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        changed_shop_products = bulk_update.call_args[0][0]
+    assert [shop_product.product.sku for shop_product in changed_shop_products] == ["size-m"]
+    assert get_product_version(product.pk) != version
+    assert Product.objects.get(sku="size-m").get_shop_instance(shop).default_price_value == Decimal("8")
+
+
+@pytest.mark.django_db
+def test_bulk_created_children_slugs_and_price_caches(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Size": size}, "sku": "size-%s" % size, "price": "5"}
+        for size in ["S", "M"]
+    ]
+    bump_path = "shuup_product_variations.admin.variation_updater.bump_price_info_cache"
+    with mock.patch(bump_path) as bump_price_info_cache:
+        response = client.post(view_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        bump_price_info_cache.assert_called_once_with(shop.pk)
+
+    for child in product.variation_children.all():
+        assert child.slug
+        assert child.slug == slugify(child.name)
+
+    # unchanged prices keep the caches while changed ones bump them
+    with mock.patch(bump_path) as bump_price_info_cache:
+        response = client.post(view_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        assert not bump_price_info_cache.called
+
+    payload[0]["price"] = "6"
+    with mock.patch(bump_path) as bump_price_info_cache:
+        response = client.post(view_url, data=payload, content_type="application/json")
+        assert response.status_code == 200
+        bump_price_info_cache.assert_called_once_with(shop.pk)
+
+
+@pytest.mark.django_db
+def test_parent_price_maintenance(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier, default_price=3)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"Size": "S"}, "sku": "size-s", "price": "10"},
+        {"combination": {"Size": "M"}, "sku": "size-m", "price": "12"},
+        {"combination": {"Size": "L"}, "sku": "size-l", "price": "14"},
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    shop_product.refresh_from_db()
+    assert shop_product.default_price_value == Decimal("10")
+
+    # a cheaper child lowers the price
+    response = client.post(view_url, data=[dict(payload[2], price="8")], content_type="application/json")
+    assert response.status_code == 200
+    shop_product.refresh_from_db()
+    assert shop_product.default_price_value == Decimal("8")
+
+    # raising the cheapest child falls back to the next cheapest one
+    response = client.post(view_url, data=[dict(payload[2], price="20")], content_type="application/json")
+    assert response.status_code == 200
+    shop_product.refresh_from_db()
+    assert shop_product.default_price_value == Decimal("10")
+
+    # so does removing it
+    response = client.delete(view_url, data=[{"sku": "size-s"}], content_type="application/json")
+    assert response.status_code == 200
+    shop_product.refresh_from_db()
+    assert shop_product.default_price_value == Decimal("12")
+
+    shop_product.default_price_value = 100
+    shop_product.save()
+    call_command("recompute_variation_parent_prices")
+    shop_product.refresh_from_db()
+    assert shop_product.default_price_value == Decimal("12")
+
+
+@pytest.mark.django_db
+def test_variation_combinations_read_model(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    supplier.stock_managed = True
+    supplier.save()
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Color": "Red", "Size": size}, "sku": "red-%s" % size, "price": "5", "stock_count": 3}
+        for size in ["S", "M"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    rows = VariationCombination.objects.filter(parent=product, shop=shop, supplier=supplier)
+    assert rows.count() == 2
+    red_s = rows.get(sku="red-s")
+    assert red_s.combination == {"Color": "Red", "Size": "S"}
+    assert red_s.price == Decimal("5")
+    assert red_s.stock_count == Decimal("3")
+    assert len(red_s.value_ids) == 2
+
+    # reads do not go through the variations anymore
+    with mock.patch("shuup_product_variations.combinations.get_available_combinations") as get_combinations:
+        data = client.get(view_url).json()
+        assert not get_combinations.called
+    assert len(data["combinations"]) == 2
+    item = [item for item in data["product_data"] if item["sku"] == "red-s"][0]
+    assert Decimal(item["price"]) == Decimal("5")
+    assert Decimal(item["stock_count"]) == Decimal("3")
+
+    # writes outside of the variation admin are reflected
+    child = red_s.product
+    child.sku = "red-small"
+    child.save()
+    child_shop_product = child.get_shop_instance(shop)
+    child_shop_product.default_price_value = Decimal("7")
+    child_shop_product.save()
+    supplier.adjust_stock(child.pk, 2)
+    red_s.refresh_from_db()
+    assert red_s.sku == "red-small"
+    assert red_s.price == Decimal("7")
+    assert red_s.stock_count == Decimal("5")
+
+    # the stocks of another supplier do not leak into the rows of the supplier
+    other_supplier = factories.get_supplier("simple_supplier", shop, stock_managed=True)
+    other_supplier.adjust_stock(child.pk, 100)
+    red_s.refresh_from_db()
+    assert red_s.stock_count == Decimal("5")
+    VariationCombination.objects.all().delete()
+    data = client.get(view_url).json()
+    item = [item for item in data["product_data"] if item["sku"] == "red-small"][0]
+    assert Decimal(item["stock_count"]) == Decimal("5")
+
+    # renaming a variable builds the rows again on the next read
+    color = ProductVariationVariable.objects.get(product=product, identifier="color")
+    variable_url = reverse(
+        "shuup_admin:shuup_product_variations.product.variations_variable", kwargs={"pk": color.pk}
+    )
+    response = client.post(variable_url, data={"language_code": "en", "name": "Colour"}, content_type="application/json")
+    assert response.status_code == 200
+    assert not rows.exists()
+    data = client.get(view_url).json()
+    assert all(combination["combination"]["Colour"] == "Red" for combination in data["combinations"])
+    assert rows.count() == 2
+
+    # every supplier of the parent is rebuilt in a single pass
+    product.get_shop_instance(shop).suppliers.add(other_supplier)
+    VariationCombination.objects.all().delete()
+    with mock.patch(
+        "shuup_product_variations.management.commands.rebuild_variation_combinations.refresh_variation_combinations",
+        wraps=refresh_variation_combinations
+    ) as refresh_combinations:
+        call_command("rebuild_variation_combinations")
+        assert refresh_combinations.call_count == 1
+    assert rows.count() == 2
+    assert VariationCombination.objects.filter(parent=product, shop=shop, supplier=other_supplier).count() == 2
+
+
+@pytest.mark.django_db
+def test_variation_combinations_incremental_refresh(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Size": size}, "sku": "size-%s" % size, "price": "5"}
+        for size in ["S", "M", "L"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    rows = VariationCombination.objects.filter(parent=product, shop=shop, supplier=supplier)
+    row_ids = dict(rows.values_list("sku", "pk"))
+    assert len(row_ids) == 3
+
+    # only the rows of the changed children are written again
+    payload[1]["price"] = "8"
+    payload.append({"combination": {"Size": "XL"}, "sku": "size-XL", "price": "9"})
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    new_row_ids = dict(rows.values_list("sku", "pk"))
+    assert len(new_row_ids) == 4
+    assert new_row_ids["size-S"] == row_ids["size-S"]
+    assert new_row_ids["size-L"] == row_ids["size-L"]
+    assert new_row_ids["size-M"] != row_ids["size-M"]
+    assert rows.get(sku="size-M").price == Decimal("8")
+
+    # a new variable changes every combination
+    payload = [{"combination": {"Size": "S", "Color": "Red"}, "sku": "size-S-red", "price": "5"}]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert list(rows.values_list("sku", flat=True)) == ["size-S-red"]
+
+    # a parent without combinations is not built again on every read
+    response = client.delete(view_url, data=[{"sku": "size-S-red"}], content_type="application/json")
+    assert response.status_code == 200
+    assert not rows.exists()
+    with mock.patch(
+        "shuup_product_variations.combinations.refresh_variation_combinations"
+    ) as refresh_combinations:
+        for index in range(2):
+            response = client.get(view_url)
+            assert response.status_code == 200
+            assert response.json()["combinations"] == []
+        assert refresh_combinations.call_count == 1
+
+
+@pytest.mark.django_db
+def test_variation_combinations_refresh_in_other_shops(admin_user):
+    shop = factories.get_default_shop()
+    other_shop = factories.get_shop(identifier="other-shop")
+    supplier = factories.get_supplier("simple_supplier", shop)
+    supplier.shops.add(other_shop)
+    product = factories.create_product("parent-sku", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    view_url = reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk))
+
+    client = Client()
+    client.force_login(admin_user)
+    payload = [
+        {"combination": {"Size": size}, "sku": "size-%s" % size, "price": "5"}
+        for size in ["S", "M"]
+    ]
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+
+    for child in [product] + list(product.variation_children.all()):
+        other_shop_product = ShopProduct.objects.create(product=child, shop=other_shop, default_price_value=5)
+        other_shop_product.suppliers.add(supplier)
+    refresh_variation_combinations(product, other_shop, supplier)
+    other_rows = VariationCombination.objects.filter(parent=product, shop=other_shop, supplier=supplier)
+    assert set(other_rows.values_list("sku", flat=True)) == {"size-S", "size-M"}
+
+    # the SKUs are shared by the shops
+    payload[1]["sku"] = "size-M-new"
+    response = client.post(view_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert set(other_rows.values_list("sku", flat=True)) == {"size-S", "size-M-new"}
+
+    # and so are the deletions
+    response = client.delete(view_url, data=[{"sku": "size-S"}], content_type="application/json")
+    assert response.status_code == 200
+    assert list(other_rows.values_list("sku", flat=True)) == ["size-M-new"]
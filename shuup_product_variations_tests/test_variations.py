@@ -5,12 +5,16 @@
 #
 # This source code is licensed under the OSL-3.0 license found in the
 # LICENSE file in the root directory of this source tree.
+import gzip
 import json
+import mock
 import pytest
 
 from decimal import Decimal
 
 from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.test import Client
 from parler.utils.context import switch_language
@@ -187,3 +191,275 @@ def test_variations_aka_variation_template_models(admin_user):
     
     assert VariationVariable.objects.count() == 1
     assert VariationVariableValue.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_variations_list_conditional_get(admin_user):
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("shuup_admin:shuup_product_variations.variations.list")
+
+    response = client.post(url, data={"name": "Size", "values": ["S", "M"]}, content_type="application/json")
+    assert response.status_code == 200
+
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response["ETag"]
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+    response = client.post(url, data={"name": "Size", "values": ["S", "M", "L"]}, content_type="application/json")
+    assert response.status_code == 200
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert len(list(response.json()["values"].values())[0]) == 3
+
+
+@pytest.mark.django_db
+def test_variations_list_compressed_snapshot(admin_user):
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("shuup_admin:shuup_product_variations.variations.list")
+
+    response = client.post(url, data={"name": "Size", "values": ["S", "M"]}, content_type="application/json")
+    assert response.status_code == 200
+
+    response = client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+    assert response.status_code == 200
+    assert response["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response["Vary"]
+    data = json.loads(gzip.decompress(response.content).decode("utf-8"))
+    assert [value["name"] for value in list(data["values"].values())[0]] == ["S", "M"]
+
+    # the snapshot is served from the cache until the library changes
+    with mock.patch("shuup_product_variations.cache._get_library_data") as get_library_data:
+        response = client.get(url)
+        assert not get_library_data.called
+    assert "Content-Encoding" not in response
+    assert response.json() == data
+
+    size = VariationVariable.objects.get(identifier="size")
+    value_url = reverse(
+        "shuup_admin:shuup_product_variations.variations_variable_value",
+        kwargs={"pk": size.values.get(identifier="m").pk}
+    )
+    response = client.post(value_url, data={"language_code": "en", "name": "Medium"}, content_type="application/json")
+    assert response.status_code == 200
+    data = client.get(url).json()
+    assert [value["name"] for value in list(data["values"].values())[0]] == ["S", "Medium"]
+
+    response = client.delete(
+        reverse("shuup_admin:shuup_product_variations.variations_variable", kwargs={"pk": size.pk}),
+        data={"name": "Size"},
+        content_type="application/json"
+    )
+    assert response.status_code == 200
+    assert client.get(url).json() == {"variables": {}, "values": {}}
+
+
+@pytest.mark.django_db
+def test_variations_bulk_translations(admin_user):
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("shuup_admin:shuup_product_variations.variations.list")
+    translations_url = reverse("shuup_admin:shuup_product_variations.variations.translations")
+
+    response = client.post(url, data={"name": "Size", "values": ["S", "M"]}, content_type="application/json")
+    assert response.status_code == 200
+    size = VariationVariable.objects.get(identifier="size")
+    small = size.values.get(identifier="s")
+    medium = size.values.get(identifier="m")
+    assert client.get(url).json()["variables"][str(size.pk)]["name"] == "Size"
+
+    payload = {
+        "variables": {size.pk: {"fi": "Koko", "en": "Sizes"}},
+        "values": {small.pk: {"fi": "Pieni"}, medium.pk: {"fi": "Keskikokoinen", "en": "Medium"}}
+    }
+    response = client.post(translations_url, data=payload, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["written"] == 5
+
+    for item, language_code, name in [
+        (size, "fi", "Koko"), (size, "en", "Sizes"), (small, "fi", "Pieni"), (medium, "en", "Medium")
+    ]:
+        item = type(item).objects.get(pk=item.pk)
+        with switch_language(item, language_code):
+            assert (item.name if hasattr(item, "name") else item.value) == name
+
+    # the library snapshot is built again
+    assert client.get(url).json()["variables"][str(size.pk)]["name"] == "Sizes"
+
+    # unchanged names are not written again
+    response = client.post(translations_url, data=payload, content_type="application/json")
+    assert response.json()["written"] == 0
+
+    response = client.post(
+        translations_url, data={"values": {small.pk + 1000: {"fi": "Pieni"}}}, content_type="application/json"
+    )
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+
+
+@pytest.mark.django_db
+def test_variations_bulk_reorder(admin_user):
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("shuup_admin:shuup_product_variations.variations.list")
+    reorder_url = reverse("shuup_admin:shuup_product_variations.variations.reorder")
+
+    for name, values in [("Size", ["S", "M", "L"]), ("Color", ["Red"])]:
+        response = client.post(url, data={"name": name, "values": values}, content_type="application/json")
+        assert response.status_code == 200
+    size = VariationVariable.objects.get(identifier="size")
+    color = VariationVariable.objects.get(identifier="color")
+    value_ids = [size.values.get(identifier=identifier).pk for identifier in ["l", "m", "s"]]
+
+    response = client.post(reorder_url, data={"values": value_ids}, content_type="application/json")
+    assert response.status_code == 200
+    assert response.json()["written"] == 2
+    data = client.get(url).json()
+    assert {value["name"]: value["order"] for value in data["values"][str(size.pk)]} == {"L": 0, "M": 1, "S": 2}
+
+    response = client.post(reorder_url, data={"variables": [color.pk, size.pk]}, content_type="application/json")
+    assert response.status_code == 200
+    assert client.get(url).json()["variables"][str(size.pk)]["order"] == 1
+
+    response = client.post(
+        reorder_url, data={"variables": [color.pk], "values": value_ids}, content_type="application/json"
+    )
+    assert response.status_code == 400
+    assert response.json()["code"] == "validation-fail"
+
+
+@pytest.mark.django_db
+def test_save_variations_library_variable_in_bulk(admin_user):
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("shuup_admin:shuup_product_variations.variations.list")
+
+    def get_save_queries(name, values):
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(url, data={"name": name, "values": values}, content_type="application/json")
+            assert response.status_code == 200
+        return len(context.captured_queries)
+
+    # the amount of queries does not depend on the amount of values
+    assert get_save_queries("Size", ["S", "M"]) == get_save_queries("Color", ["C%03d" % code for code in range(100)])
+
+    color = VariationVariable.objects.get(identifier="color")
+    assert color.values.count() == 100
+    assert color.values.get(identifier="c042").value == "C042"
+
+    # the values that are not given anymore are deleted
+    new_values = ["C%03d" % code for code in range(50, 120)]
+    kept_value_id = color.values.get(identifier="c050").pk
+    response = client.post(url, data={"name": "Color", "values": new_values}, content_type="application/json")
+    assert response.status_code == 200
+    assert sorted(
+        VariationVariableValue.objects.filter(variable=color).values_list("translations__value", flat=True)
+    ) == new_values
+    assert color.values.get(identifier="c050").pk == kept_value_id
+
+    data = client.get(url).json()
+    assert len(data["values"][str(color.pk)]) == 70
+
+
+@pytest.mark.django_db
+def test_save_variations_library_values_with_empty_and_colliding_slugs(admin_user):
+    client = Client()
+    client.force_login(admin_user)
+    url = reverse("shuup_admin:shuup_product_variations.variations.list")
+
+    # "红色" and the emojis slugify to nothing while "1/2" and "12" slugify to the same identifier
+    values = ["红色", "🙂", "🙃", "1/2", "12"]
+    response = client.post(url, data={"name": "Size", "values": values}, content_type="application/json")
+    assert response.status_code == 200
+
+    size = VariationVariable.objects.get(identifier="size")
+    assert sorted(size.values.values_list("translations__value", flat=True)) == sorted(values)
+    assert sorted(size.values.values_list("identifier", flat=True), key=str) == sorted([None] * 4 + ["12"], key=str)
+
+    # the values are matched by their names when saved again
+    values.append("½")
+    response = client.post(url, data={"name": "Size", "values": values}, content_type="application/json")
+    assert response.status_code == 200
+    assert sorted(size.values.values_list("translations__value", flat=True)) == sorted(values)
+
+
+@pytest.mark.django_db
+def test_populate_variations_in_batches(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    client = Client()
+    client.force_login(admin_user)
+
+    for index, colors in enumerate([["Red", "Blue"], ["Red", "Green", "Black"]]):
+        product = factories.create_product("parent-%d" % index, shop=shop, supplier=supplier)
+        shop_product = product.get_shop_instance(shop)
+        payload = [
+            {"combination": {"Color": color, "Size": size}, "sku": "%d-%s-%s" % (index, color, size)}
+            for color in colors
+            for size in ["S", "M"]
+        ]
+        response = client.post(
+            reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk)),
+            data=payload,
+            content_type="application/json"
+        )
+        assert response.status_code == 200
+
+    # an existing library entry is reused
+    color = VariationVariable.objects.create(identifier="color", name="Color")
+    VariationVariableValue.objects.create(variable=color, identifier="red", value="Red")
+
+    call_command("populate_variations", "--dry-run", "--batch-size=2")
+    assert VariationVariable.objects.count() == 1
+    assert VariationVariableValue.objects.count() == 1
+
+    call_command("populate_variations", "--batch-size=2")
+    assert VariationVariable.objects.count() == 2
+    assert set(VariationVariableValue.objects.filter(variable=color).values_list("identifier", flat=True)) == {
+        "red", "blue", "green", "black"
+    }
+    size = VariationVariable.objects.exclude(pk=color.pk).get()
+    assert size.identifier == "size"
+    assert size.name == "Size"
+    assert set(str(value) for value in size.values.all()) == {"S", "M"}
+
+    # running again does not create anything
+    call_command("populate_variations")
+    assert VariationVariable.objects.count() == 2
+    assert VariationVariableValue.objects.count() == 6
+
+
+@pytest.mark.django_db
+def test_populate_variations_with_empty_and_colliding_slugs(admin_user):
+    shop = factories.get_default_shop()
+    supplier = factories.get_supplier("simple_supplier", shop)
+    product = factories.create_product("parent", shop=shop, supplier=supplier)
+    shop_product = product.get_shop_instance(shop)
+    client = Client()
+    client.force_login(admin_user)
+
+    payload = [
+        {"combination": {"颜色": color, "Size": size}, "sku": "%d-%d" % (color_index, size_index)}
+        for (color_index, color) in enumerate(["红色", "🙂"])
+        for (size_index, size) in enumerate(["1/2", "12"])
+    ]
+    response = client.post(
+        reverse("shuup_admin:shuup_product_variations.product.combinations", kwargs=dict(pk=shop_product.pk)),
+        data=payload,
+        content_type="application/json"
+    )
+    assert response.status_code == 200
+
+    call_command("populate_variations", "--batch-size=1")
+    color = VariationVariable.objects.get(translations__name="颜色")
+    assert color.identifier is None
+    assert set(color.values.values_list("translations__value", flat=True)) == {"红色", "🙂"}
+    # the values with the same identifier are populated once
+    size = VariationVariable.objects.get(identifier="size")
+    assert list(size.values.values_list("identifier", flat=True)) == ["12"]
+
+    call_command("populate_variations", "--batch-size=1")
+    assert VariationVariable.objects.count() == 2
+    assert VariationVariableValue.objects.count() == 3